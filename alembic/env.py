@@ -1,9 +1,11 @@
 from os.path import abspath, dirname
+import asyncio
 import sys
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy.ext.asyncio import create_async_engine
 
 from alembic import context
 
@@ -38,6 +40,13 @@ target_metadata = Base.metadata  # <--- SET THE METADATA
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
 
+# Shards hold the links, clicks and click counters, and are migrated after the
+# primary database with `is_shard` set, so migrations can leave out the users
+# table. A shard that is the primary database is only migrated once.
+shard_urls = [
+    url for url in settings.SHARD_DATABASE_URLS if url != settings.DATABASE_URL
+]
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
@@ -51,18 +60,39 @@ def run_migrations_offline() -> None:
     script output.
 
     """
-    url = config.get_main_option("sqlalchemy.url")
+    urls = [config.get_main_option("sqlalchemy.url"), *shard_urls]
+    for index, url in enumerate(urls):
+        context.configure(
+            url=url,
+            target_metadata=target_metadata,
+            literal_binds=True,
+            dialect_opts={"paramstyle": "named"},
+            is_shard=index > 0,
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+def do_run_migrations(connection, is_shard: bool) -> None:
     context.configure(
-        url=url,
-        target_metadata=target_metadata,
-        literal_binds=True,
-        dialect_opts={"paramstyle": "named"},
+        connection=connection, target_metadata=target_metadata, is_shard=is_shard
     )
 
     with context.begin_transaction():
         context.run_migrations()
 
 
+async def run_shard_migrations(url: str) -> None:
+    """Migrates a shard through its async driver, as configured for the app."""
+    connectable = create_async_engine(url, poolclass=pool.NullPool)
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations, True)
+
+    await connectable.dispose()
+
+
 def run_migrations_online() -> None:
     """Run migrations in 'online' mode.
 
@@ -77,10 +107,10 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        do_run_migrations(connection, is_shard=False)
 
-        with context.begin_transaction():
-            context.run_migrations()
+    for url in shard_urls:
+        asyncio.run(run_shard_migrations(url))
 
 
 if context.is_offline_mode():
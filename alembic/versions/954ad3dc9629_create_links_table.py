@@ -24,14 +24,18 @@ def upgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
     op.create_table(
         "links",
-        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "id",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            nullable=False,
+        ),
         sa.Column("short_code", sa.String(), nullable=False),
         sa.Column("original_url", sa.String(), nullable=False),
         sa.Column("visit_count", sa.Integer(), nullable=False),
         sa.Column(
             "created_at",
             sa.TIMESTAMP(timezone=True),
-            server_default=sa.text("now()"),
+            server_default=sa.func.now(),
             nullable=True,
         ),
         sa.PrimaryKeyConstraint("id"),
@@ -21,31 +21,47 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
+    # Shards keep links without the users table, which stays in the primary.
+    if op.get_context().opts.get("is_shard", False):
+        op.add_column("links", sa.Column("user_id", sa.BigInteger(), nullable=True))
+        return
+
     # ### commands auto generated by Alembic - please adjust! ###
     op.create_table(
         "users",
-        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "id",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            nullable=False,
+        ),
         sa.Column("email", sa.String(), nullable=False),
         sa.Column("password_hash", sa.String(), nullable=False),
         sa.Column(
             "created_at",
             sa.TIMESTAMP(timezone=True),
-            server_default=sa.text("now()"),
+            server_default=sa.func.now(),
             nullable=True,
         ),
         sa.PrimaryKeyConstraint("id"),
     )
     op.create_index(op.f("ix_users_email"), "users", ["email"], unique=True)
     op.create_index(op.f("ix_users_id"), "users", ["id"], unique=False)
-    op.add_column("links", sa.Column("user_id", sa.BigInteger(), nullable=True))
-    op.create_foreign_key(None, "links", "users", ["user_id"], ["id"])
+    # Batch mode lets SQLite, used for local shards and tests, add the key. It
+    # is named as Postgres names it by default.
+    with op.batch_alter_table("links") as batch_op:
+        batch_op.add_column(sa.Column("user_id", sa.BigInteger(), nullable=True))
+        batch_op.create_foreign_key("links_user_id_fkey", "users", ["user_id"], ["id"])
     # ### end Alembic commands ###
 
 
 def downgrade() -> None:
     """Downgrade schema."""
+    if op.get_context().opts.get("is_shard", False):
+        op.drop_column("links", "user_id")
+        return
+
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_constraint(None, "links", type_="foreignkey")
+    op.drop_constraint("links_user_id_fkey", "links", type_="foreignkey")
     op.drop_column("links", "user_id")
     op.drop_index(op.f("ix_users_id"), table_name="users")
     op.drop_index(op.f("ix_users_email"), table_name="users")
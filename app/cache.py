@@ -1,11 +1,18 @@
 import json
 import redis.asyncio as redis
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Iterable
 
+from app import utils
 from app.config import settings
 
 redis_pool: Optional[redis.Redis] = None
 
+# Last known good resolutions, kept per process so redirects can still be
+# served while Redis and Postgres are both unavailable.
+stale_links: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
 
 async def init_redis_pool():
     """
@@ -35,6 +42,58 @@ async def get_link_from_cache(short_code: str) -> Optional[Dict[str, Any]]:
     return None
 
 
-async def set_link_in_cache(short_code: str, link_id: int, original_url: str):
-    cache_data = {"link_id": link_id, "original_url": original_url}
-    await redis_pool.set(short_code, json.dumps(cache_data), ex=3600)
+def make_cache_data(link) -> Dict[str, Any]:
+    """Builds the cached representation of a link from its database row."""
+    return {
+        "link_id": link.id,
+        "original_url": link.original_url,
+        "expires_at": (
+            utils.as_utc(link.expires_at).timestamp() if link.expires_at else None
+        ),
+        "redirect_status": link.redirect_status,
+        "cache_max_age": link.cache_max_age,
+    }
+
+
+def get_cache_ttl(expires_at: Optional[float] = None) -> int:
+    """
+    Returns the number of seconds a link may stay cached: the default TTL,
+    or the link's remaining lifetime if that is shorter.
+    """
+    if expires_at is None:
+        return settings.CACHE_TTL_SECONDS
+    remaining = expires_at - datetime.now(timezone.utc).timestamp()
+    return max(0, min(settings.CACHE_TTL_SECONDS, int(remaining)))
+
+
+async def set_link_in_cache(short_code: str, link_data: Dict[str, Any]):
+    ttl = get_cache_ttl(link_data.get("expires_at"))
+    if ttl <= 0:
+        return
+    await redis_pool.set(short_code, json.dumps(link_data), ex=ttl)
+
+
+async def delete_links_from_cache(short_codes: Iterable[str]):
+    short_codes = list(short_codes)
+    if short_codes:
+        await redis_pool.delete(*short_codes)
+
+
+def remember_link(short_code: str, link_data: Dict[str, Any]):
+    """Records a successful resolution in the bounded in-process stale cache."""
+    stale_links[short_code] = link_data
+    stale_links.move_to_end(short_code)
+    while len(stale_links) > settings.STALE_LINK_CACHE_SIZE:
+        stale_links.popitem(last=False)
+
+
+def get_stale_link(short_code: str) -> Optional[Dict[str, Any]]:
+    """Returns the last known resolution of a link, unless it has expired."""
+    link_data = stale_links.get(short_code)
+    if link_data is None:
+        return None
+    expires_at = link_data.get("expires_at")
+    if expires_at is not None and expires_at <= datetime.now(timezone.utc).timestamp():
+        del stale_links[short_code]
+        return None
+    return link_data
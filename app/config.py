@@ -1,3 +1,5 @@
+from typing import List, Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,5 +14,71 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
 
+    # Number of distinct User-Agent strings whose classification is memoized.
+    USER_AGENT_CACHE_SIZE: int = 4096
+
+    # Upper bound on how long a link stays in the Redis cache. Links that expire
+    # sooner are cached only for their remaining lifetime.
+    CACHE_TTL_SECONDS: int = 3600
+
+    # Expired links are either deleted with their clicks or kept as archived.
+    LINK_SWEEP_ACTION: Literal["delete", "archive"] = "delete"
+    LINK_SWEEP_BATCH_SIZE: int = 500
+    LINK_SWEEP_INTERVAL_SECONDS: int = 60
+
+    # Redirects can be served from a memory-mapped link snapshot exported with
+    # `python -m app.snapshot`. "first" falls back to Redis and Postgres on a
+    # miss; "only" never touches them, for database-free edge nodes.
+    SNAPSHOT_MODE: Literal["off", "first", "only"] = "off"
+    SNAPSHOT_PATH: str = "links.snapshot"
+    SNAPSHOT_RELOAD_SECONDS: int = 5
+
+    # Timeout budgets and circuit breaker tuning for the redirect path.
+    CACHE_TIMEOUT_SECONDS: float = 0.05
+    BROKER_TIMEOUT_SECONDS: float = 0.25
+    DATABASE_TIMEOUT_SECONDS: float = 1.0
+    DATABASE_POOL_TIMEOUT_SECONDS: float = 2.0
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_SECONDS: float = 10.0
+
+    # Clicks that cannot be handed to the broker are appended to this file and
+    # replayed once the broker recovers, a batch at a time.
+    CLICK_SPOOL_PATH: str = "clicks.spool"
+    CLICK_SPOOL_REPLAY_SECONDS: int = 30
+    CLICK_SPOOL_REPLAY_BATCH_SIZE: int = 500
+
+    # Number of recently resolved links kept in memory per process, served
+    # when both Redis and Postgres are unavailable.
+    STALE_LINK_CACHE_SIZE: int = 10000
+
+    # Clicks from known bots are either dropped or stored flagged as bots,
+    # which keeps them out of visit counts.
+    BOT_CLICK_POLICY: Literal["drop", "flag"] = "drop"
+    # Repeat clicks from the same IP on the same link within this many seconds
+    # are collapsed into one (0 disables). Each time bucket uses a Bloom filter
+    # of CLICK_DEDUP_FILTER_BITS bits in Redis.
+    CLICK_DEDUP_WINDOW_SECONDS: int = 30
+    CLICK_DEDUP_FILTER_BITS: int = 2**23
+    CLICK_DEDUP_HASHES: int = 4
+
+    # Webhook that purges cached redirects from a CDN or edge cache. It receives
+    # a JSON body of the form {"surrogate_keys": [short_code, ...]}.
+    EDGE_PURGE_URL: Optional[str] = None
+    EDGE_PURGE_TOKEN: Optional[str] = None
+    EDGE_PURGE_TIMEOUT_SECONDS: float = 5.0
+
+    # Links and their clicks are spread over these databases by consistent
+    # hashing of the short code, e.g. '["postgresql+psycopg_async://...", ...]'.
+    # Users always live in DATABASE_URL. Empty means DATABASE_URL is the only
+    # shard; when enabling sharding, list it first so existing links stay on
+    # shard 0. Shards must only ever be appended; run `alembic upgrade head`
+    # and `python -m app.rebalance` after adding one.
+    SHARD_DATABASE_URLS: List[str] = []
+    SHARD_VIRTUAL_NODES: int = 64
+    # Set to the previous number of shards while a rebalance after appending
+    # shards is pending. Until then, reads and clicks fall back to the shard
+    # that owned a code before the append. Unset it once the rebalance is done.
+    SHARD_PREVIOUS_COUNT: Optional[int] = None
+
 
 settings = Settings()
@@ -1,11 +1,12 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func, cast, Date
+from sqlalchemy import func, Date, delete, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from passlib.context import CryptContext
-from typing import Union
+from typing import List, Union
 
-from datetime import date, timedelta
-from . import models, schemas, utils
+from datetime import date, datetime, timedelta, timezone
+from . import models, schemas, utils, user_agents
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,42 +20,57 @@ async def get_link_by_short_code(db: AsyncSession, short_code: str):
     return result.scalar_one_or_none()
 
 
-async def get_link_by_original_url(db: AsyncSession, original_url: str):
-    """Checks if a URL has already been shortened."""
+async def get_link_by_original_url(
+    db: AsyncSession,
+    original_url: str,
+    redirect_status: int = 307,
+    cache_max_age: Union[int, None] = None,
+):
+    """
+    Checks if a URL has already been shortened with the same redirect policy
+    and without any usage limits.
+    """
     result = await db.execute(
-        select(models.Link).filter(models.Link.original_url == original_url)
+        select(models.Link)
+        .filter(models.Link.original_url == original_url)
+        .filter(models.Link.expires_at.is_(None))
+        .filter(models.Link.max_clicks.is_(None))
+        .filter(models.Link.redirect_status == redirect_status)
+        .filter(models.Link.cache_max_age.is_not_distinct_from(cache_max_age))
     )
-    return result.scalar_one_or_none()
+    return result.scalars().first()
+
 
+def is_link_expired(link: models.Link) -> bool:
+    """Checks whether a link has passed its expiry time or click limit."""
+    if link.archived_at is not None:
+        return True
+    if link.expires_at is not None and utils.as_utc(link.expires_at) <= datetime.now(
+        timezone.utc
+    ):
+        return True
+    return link.max_clicks is not None and link.visit_count >= link.max_clicks
 
-async def create_short_link(
-    db: AsyncSession, link: schemas.LinkCreate, user_id: Union[int, None] = None
+
+async def insert_link(
+    db: AsyncSession,
+    link: schemas.LinkCreate,
+    short_code: str,
+    user_id: Union[int, None] = None,
 ) -> models.Link:
-    """
-    Creates a new short link in the database, handling collisions.
-    """
-    # 1. Check if the URL has already been shortened.
-    existing_link = await get_link_by_original_url(db, str(link.original_url))
-    if existing_link:
-        return existing_link
-
-    # 2. Generate an initial short code.
-    short_code = utils.generate_short_code(str(link.original_url))
-
-    # 3. Collision check loop.
-    collision_count = 0
-    while await get_link_by_short_code(db, short_code):
-        collision_count += 1
-        # If a collision occurs, append a salt and re-hash.
-        salt = str(collision_count)
-        short_code = utils.generate_short_code(str(link.original_url), salt)
-
-    # 4. Create the new link object.
+    """Inserts a link under a short code that is known to be free."""
+    # Create the new link object.
     db_link = models.Link(
-        original_url=str(link.original_url), short_code=short_code, user_id=user_id
+        original_url=str(link.original_url),
+        short_code=short_code,
+        user_id=user_id,
+        expires_at=link.expires_at,
+        max_clicks=link.max_clicks,
+        redirect_status=link.redirect_status,
+        cache_max_age=link.cache_max_age,
     )
 
-    # 5. Add to session and commit to the database.
+    # Add to session and commit to the database.
     db.add(db_link)
     await db.commit()
     await db.refresh(db_link)
@@ -62,6 +78,17 @@ async def create_short_link(
     return db_link
 
 
+async def get_links_by_user(db: AsyncSession, user_id: int, limit: int):
+    """Fetches a user's most recently created links."""
+    result = await db.execute(
+        select(models.Link)
+        .filter(models.Link.user_id == user_id)
+        .order_by(models.Link.created_at.desc(), models.Link.id.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
 async def create_user(db: AsyncSession, user: schemas.UserCreate):
     """Creates a new user in the database with a hashed password."""
     hashed_password = pwd_context.hash(user.password)
@@ -85,51 +112,192 @@ async def get_user(db: AsyncSession, user_id: int):
 
 
 async def log_click_to_db(
-    db: AsyncSession, link_id: int, ip_address: str, user_agent: str
+    db: AsyncSession,
+    link_id: int,
+    ip_address: str,
+    user_agent: str,
+    user_agent_info: user_agents.UserAgentInfo,
+    clicked_at: Union[datetime, None] = None,
 ):
-    """Logs a single click event to the database."""
+    """
+    Logs a single click event to the database, at the time of the redirect
+    if it is known rather than when the click is processed.
+    Returns the updated link, or None if the click could not be logged.
+    """
     db_click = models.Click(
-        link_id=link_id, ip_address=ip_address, user_agent=user_agent
+        link_id=link_id,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        browser_id=user_agent_info.browser_id,
+        os_id=user_agent_info.os_id,
+        device_type_id=user_agent_info.device_type_id,
+        is_bot=user_agent_info.is_bot,
     )
+    if clicked_at is not None:
+        db_click.clicked_at = clicked_at
 
     try:
         db.add(db_click)
 
         link_to_update = await db.get(models.Link, link_id)
-        if link_to_update:
+        if link_to_update and not user_agent_info.is_bot:
             link_to_update.visit_count += 1
 
+        await increment_click_dimension_count(db, link_id, user_agent_info)
+
         await db.commit()
+        return link_to_update
     except Exception as e:
         await db.rollback()
         print(f"Error logging click: {e}")
+        return None
+
+
+async def sweep_expired_links(
+    db: AsyncSession, batch_size: int, archive: bool = False
+) -> List[str]:
+    """
+    Deletes or archives one batch of links that have expired or reached their
+    click limit. Returns the short codes of the swept links.
+    """
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        select(models.Link.id, models.Link.short_code)
+        .where(models.Link.archived_at.is_(None))
+        .where(
+            or_(
+                models.Link.expires_at <= now,
+                models.Link.visit_count >= models.Link.max_clicks,
+            )
+        )
+        .limit(batch_size)
+    )
+    rows = result.all()
+    if not rows:
+        return []
+
+    link_ids = [row.id for row in rows]
+    if archive:
+        await db.execute(
+            update(models.Link)
+            .where(models.Link.id.in_(link_ids))
+            .values(archived_at=now)
+        )
+    else:
+        await db.execute(delete(models.Click).where(models.Click.link_id.in_(link_ids)))
+        await db.execute(
+            delete(models.ClickDimensionCount).where(
+                models.ClickDimensionCount.link_id.in_(link_ids)
+            )
+        )
+        await db.execute(delete(models.Link).where(models.Link.id.in_(link_ids)))
+    await db.commit()
+
+    return [row.short_code for row in rows]
+
+
+async def increment_click_dimension_count(
+    db: AsyncSession, link_id: int, user_agent_info: user_agents.UserAgentInfo
+):
+    """Bumps the pre-aggregated counter for a link's user agent dimensions."""
+    # Postgres and SQLite (used for local shards) share the upsert syntax.
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(models.ClickDimensionCount).values(
+        link_id=link_id, count=1, **user_agent_info._asdict()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            models.ClickDimensionCount.link_id,
+            models.ClickDimensionCount.browser_id,
+            models.ClickDimensionCount.os_id,
+            models.ClickDimensionCount.device_type_id,
+            models.ClickDimensionCount.is_bot,
+        ],
+        set_={"count": models.ClickDimensionCount.count + 1},
+    )
+    await db.execute(stmt)
+
+
+async def get_click_breakdown(db: AsyncSession, link_id: int, dimension, names: tuple):
+    """
+    Sums the pre-aggregated click counts for a link by a single dimension.
+    Bot clicks are reported separately, so they are left out.
+    """
+    total = func.sum(models.ClickDimensionCount.count).label("count")
+    breakdown_query = (
+        select(dimension.label("dimension_id"), total)
+        .where(models.ClickDimensionCount.link_id == link_id)
+        .where(models.ClickDimensionCount.is_bot.is_(False))
+        .group_by(dimension)
+        .order_by(total.desc())
+    )
+    breakdown_result = await db.execute(breakdown_query)
+
+    return [
+        schemas.BreakdownItem(
+            name=user_agents.dimension_name(names, row.dimension_id),
+            count=row.count,
+        )
+        for row in breakdown_result.all()
+    ]
 
 
 async def get_link_analytics(db: AsyncSession, link_id: int):
-    total_clicks_query = select(func.count(models.Click.id)).where(
-        models.Click.link_id == link_id
+    total_clicks_query = (
+        select(func.count(models.Click.id))
+        .where(models.Click.link_id == link_id)
+        .where(models.Click.is_bot.isnot(True))
     )
     total_clicks_result = await db.execute(total_clicks_query)
     total_clicks = total_clicks_result.scalar_one_or_none() or 0
 
     thirty_days_ago = date.today() - timedelta(days=30)
+    click_date = func.date(models.Click.clicked_at, type_=Date)
     clicks_by_day_query = (
         select(
-            cast(models.Click.clicked_at, Date).label("date"),
+            click_date.label("date"),
             func.count(models.Click.id).label("count"),
         )
         .where(models.Click.link_id == link_id)
-        .where(cast(models.Click.clicked_at, Date) >= thirty_days_ago)
-        .group_by(cast(models.Click.clicked_at, Date))
-        .order_by(cast(models.Click.clicked_at, Date))
+        .where(models.Click.is_bot.isnot(True))
+        .where(click_date >= thirty_days_ago)
+        .group_by(click_date)
+        .order_by(click_date)
     )
 
     clicks_by_day_result = await db.execute(clicks_by_day_query)
     clicks_by_day = clicks_by_day_result.all()
 
+    bot_clicks_query = (
+        select(func.sum(models.ClickDimensionCount.count))
+        .where(models.ClickDimensionCount.link_id == link_id)
+        .where(models.ClickDimensionCount.is_bot.is_(True))
+    )
+    bot_clicks_result = await db.execute(bot_clicks_query)
+    bot_clicks = bot_clicks_result.scalar_one_or_none() or 0
+
     return schemas.AnalyticsData(
         total_clicks=total_clicks,
+        bot_clicks=bot_clicks,
         clicks_by_day=[
             schemas.DailyClicks(date=row.date, count=row.count) for row in clicks_by_day
         ],
+        browsers=await get_click_breakdown(
+            db,
+            link_id,
+            models.ClickDimensionCount.browser_id,
+            user_agents.BROWSERS,
+        ),
+        operating_systems=await get_click_breakdown(
+            db,
+            link_id,
+            models.ClickDimensionCount.os_id,
+            user_agents.OPERATING_SYSTEMS,
+        ),
+        device_types=await get_click_breakdown(
+            db,
+            link_id,
+            models.ClickDimensionCount.device_type_id,
+            user_agents.DEVICE_TYPES,
+        ),
     )
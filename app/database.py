@@ -4,7 +4,11 @@ from sqlalchemy.orm import declarative_base
 from .config import settings
 
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=True,
+    pool_timeout=settings.DATABASE_POOL_TIMEOUT_SECONDS,
+)
 
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
@@ -1,3 +1,28 @@
+from fastapi import HTTPException, Request, Response
+from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
 
-rate_limit_dependency = RateLimiter(times=10, minutes=1)
+from app import cache
+
+
+class FailOpenRateLimiter(RateLimiter):
+    """
+    A rate limiter that lets requests through while Redis is unavailable
+    instead of failing them. If the limiter could not be initialized at
+    startup, initialization is retried on each request until it succeeds.
+    """
+
+    async def __call__(self, request: Request, response: Response):
+        try:
+            if FastAPILimiter.lua_sha is None:
+                await cache.init_redis_pool()
+                await FastAPILimiter.init(cache.redis_pool)
+            return await super().__call__(request, response)
+        except HTTPException:
+            # Raised by the limiter's callback when the rate limit is exceeded.
+            raise
+        except Exception as e:
+            print(f"Rate limiter unavailable, allowing request: {e!r}")
+
+
+rate_limit_dependency = FailOpenRateLimiter(times=10, minutes=1)
@@ -0,0 +1,61 @@
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import httpx
+
+from app.config import settings
+
+PERMANENT_REDIRECT_STATUSES = (301, 308)
+
+
+def get_redirect_headers(short_code: str, link_data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Builds the caching headers for a redirect from the link's policy. Links
+    without a cache max-age are not cached, so every visit reaches the origin
+    and is counted. Cached redirects never outlive the link.
+    """
+    max_age: Optional[int] = link_data.get("cache_max_age")
+    if max_age is None:
+        # Temporary redirects are not cached by default, but browsers keep
+        # permanent ones indefinitely unless told otherwise.
+        if link_data.get("redirect_status") in PERMANENT_REDIRECT_STATUSES:
+            return {"Cache-Control": "no-store"}
+        return {}
+
+    expires_at = link_data.get("expires_at")
+    if expires_at:
+        max_age = max(0, min(max_age, int(expires_at - time.time())))
+
+    return {
+        "Cache-Control": f"public, max-age={max_age}",
+        "Surrogate-Control": f"max-age={max_age}",
+        # Lets edge caches purge every cached variant of a link by its code.
+        "Surrogate-Key": short_code,
+    }
+
+
+async def purge_links(short_codes: Iterable[str]):
+    """
+    Asks the edge cache to drop cached redirects for the given short codes by
+    POSTing their surrogate keys to EDGE_PURGE_URL. Does nothing if no purge
+    hook is configured; failures are logged but not raised.
+    """
+    short_codes = list(short_codes)
+    if not settings.EDGE_PURGE_URL or not short_codes:
+        return
+
+    headers = {}
+    if settings.EDGE_PURGE_TOKEN:
+        headers["Authorization"] = f"Bearer {settings.EDGE_PURGE_TOKEN}"
+    try:
+        async with httpx.AsyncClient(
+            timeout=settings.EDGE_PURGE_TIMEOUT_SECONDS
+        ) as client:
+            response = await client.post(
+                settings.EDGE_PURGE_URL,
+                json={"surrogate_keys": short_codes},
+                headers=headers,
+            )
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Edge purge failed for {len(short_codes)} links: {e!r}")
@@ -1,15 +1,36 @@
+import asyncio
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, status
 from fastapi.responses import RedirectResponse
 from fastapi_limiter import FastAPILimiter
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import cache, crud
-from .database import SessionLocal
+from . import cache, crud, edge, sharded_crud, snapshot
+from .config import settings
+from .resilience import cache_breaker
 from .routers import auth as auth_router
+from .routers import health as health_router
 from .routers import links as links_router
-from .tasks import log_click_task
+from .tasks import replay_spooled_clicks, send_click
+
+
+async def replay_spooled_clicks_periodically():
+    """
+    Hands clicks spooled during broker outages back to the broker. Each batch
+    is replayed in a worker thread, so redirects are never held up by it.
+    """
+    batch_size = settings.CLICK_SPOOL_REPLAY_BATCH_SIZE
+    while True:
+        await asyncio.sleep(settings.CLICK_SPOOL_REPLAY_SECONDS)
+        replayed = 0
+        while True:
+            batch = await asyncio.to_thread(replay_spooled_clicks, batch_size)
+            replayed += batch
+            if batch < batch_size:
+                break
+        if replayed:
+            print(f"Replayed {replayed} spooled clicks")
 
 
 @asynccontextmanager
@@ -19,10 +40,20 @@ async def lifespan(app: FastAPI):
     """
     # Initialize the Redis connection pool and the rate limiter on startup
     await cache.init_redis_pool()
-    await FastAPILimiter.init(cache.redis_pool)
+    try:
+        await FastAPILimiter.init(cache.redis_pool)
+    except Exception as e:
+        # Redirects must keep working while Redis is down. The rate limiter
+        # fails open and retries initialization on its next use.
+        print(f"Could not initialize rate limiter: {e!r}")
+    if settings.SNAPSHOT_MODE != "off":
+        snapshot.load_snapshot()
+    spool_replayer = asyncio.create_task(replay_spooled_clicks_periodically())
     yield
+    spool_replayer.cancel()
     # Clean up the Redis connection pool on shutdown
     await cache.close_redis_pool()
+    snapshot.close_snapshot()
 
 
 # Create the FastAPI app instance
@@ -34,16 +65,10 @@ app = FastAPI(
 )
 
 
-# This is a dependency function to get a DB session for each request.
-# It ensures the session is always closed after the request is finished.
-async def get_db():
-    async with SessionLocal() as session:
-        yield session
-
-
 # --- API Endpoints ---
 app.include_router(auth_router.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(links_router.router, prefix="/api/links", tags=["Links"])
+app.include_router(health_router.router, prefix="/api/health", tags=["Health"])
 
 
 @app.get(
@@ -52,40 +77,84 @@ app.include_router(links_router.router, prefix="/api/links", tags=["Links"])
     status_code=status.HTTP_307_TEMPORARY_REDIRECT,
 )
 async def redirect_to_url(
-    short_code: str, request: Request, db: AsyncSession = Depends(get_db)
+    short_code: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
 ):
     """
     Redirects to the original URL associated with the short code.
     """
 
-    link_id_to_log = None
-    url_to_redirect = None
+    link_data = None
 
-    cached_link_data = await cache.get_link_from_cache(short_code)
-    if cached_link_data:
-        print(f"CACHE HIT for {short_code}")
-        link_id_to_log = cached_link_data.get("link_id")
-        url_to_redirect = cached_link_data.get("original_url")
-    else:
-        print(f"CACHE MISS for {short_code}")
-        db_link = await crud.get_link_by_short_code(db, short_code=short_code)
-        if db_link:
-            link_id_to_log = db_link.id
-            url_to_redirect = db_link.original_url
-            await cache.set_link_in_cache(
-                short_code=db_link.short_code,
-                link_id=db_link.id,
-                original_url=db_link.original_url,
-            )
-
-    if not url_to_redirect or not link_id_to_log:
+    snapshot_entry = snapshot.get_link_from_snapshot(short_code)
+    if snapshot_entry:
+        link_data = snapshot_entry._asdict()
+    elif settings.SNAPSHOT_MODE != "only":
+        link_data = await resolve_link(short_code)
+
+    if not link_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Short link not found."
         )
 
-    log_click_task.send(
-        link_id_to_log,
+    # Runs in a worker thread after the response is sent, so a slow broker
+    # never delays the redirect.
+    background_tasks.add_task(
+        send_click,
+        link_data["link_id"],
         request.client.host,
-        request.headers.get("user-agent", "Unknown"),
+        # A missing header is left empty so the click is classified as a bot.
+        request.headers.get("user-agent", ""),
+        short_code,
+        time.time(),
     )
-    return RedirectResponse(url=url_to_redirect)
+    return RedirectResponse(
+        url=link_data["original_url"],
+        status_code=link_data.get("redirect_status") or 307,
+        headers=edge.get_redirect_headers(short_code, link_data),
+    )
+
+
+async def resolve_link(short_code: str):
+    """
+    Resolves a short code through Redis and then its Postgres shard, each
+    guarded by a circuit breaker. If the shard cannot be reached, the last
+    known resolution held in memory is served instead.
+    """
+    try:
+        cached_link_data = await cache_breaker.call(
+            cache.get_link_from_cache, short_code
+        )
+    except Exception as e:
+        print(f"CACHE UNAVAILABLE for {short_code}: {e!r}")
+        cached_link_data = None
+
+    if cached_link_data:
+        print(f"CACHE HIT for {short_code}")
+        cache.remember_link(short_code, cached_link_data)
+        return cached_link_data
+
+    print(f"CACHE MISS for {short_code}")
+    try:
+        db_link = await sharded_crud.get_link_by_short_code(short_code)
+    except Exception as e:
+        print(f"DATABASE UNAVAILABLE for {short_code}: {e!r}")
+        stale_link_data = cache.get_stale_link(short_code)
+        if stale_link_data:
+            return stale_link_data
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Short link temporarily unavailable.",
+        )
+
+    if not db_link or crud.is_link_expired(db_link):
+        return None
+
+    link_data = cache.make_cache_data(db_link)
+    cache.remember_link(short_code, link_data)
+    try:
+        await cache_breaker.call(cache.set_link_in_cache, short_code, link_data)
+    except Exception as e:
+        print(f"CACHE UNAVAILABLE for {short_code}: {e!r}")
+    return link_data
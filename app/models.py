@@ -1,11 +1,25 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, BigInteger, ForeignKey, Text
+from sqlalchemy import (
+    Column,
+    Integer,
+    SmallInteger,
+    String,
+    TIMESTAMP,
+    BigInteger,
+    Boolean,
+    ForeignKey,
+    Index,
+    Text,
+)
 from sqlalchemy.sql import func
 from .database import Base
 
+# SQLite only auto-increments INTEGER primary keys, so local shards use those.
+BigIntegerPK = BigInteger().with_variant(Integer, "sqlite")
+
 
 class User(Base):
     __tablename__ = "users"
-    id = Column(BigInteger, primary_key=True, index=True)
+    id = Column(BigIntegerPK, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
@@ -13,20 +27,59 @@ class User(Base):
 
 class Link(Base):
     __tablename__ = "links"
-    id = Column(BigInteger, primary_key=True, index=True)
-    user_id = Column(BigInteger, ForeignKey("users.id"), nullable=True)
+    id = Column(BigIntegerPK, primary_key=True, index=True)
+    user_id = Column(BigInteger, ForeignKey("users.id"), nullable=True, index=True)
     short_code = Column(String, unique=True, index=True, nullable=False)
     original_url = Column(String, nullable=False)
     visit_count = Column(Integer, default=0, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    max_clicks = Column(Integer, nullable=True)
+    archived_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    redirect_status = Column(
+        SmallInteger, default=307, server_default="307", nullable=False
+    )
+    # Browser/CDN cache lifetime for the redirect; None disables caching.
+    cache_max_age = Column(Integer, nullable=True)
+
+    # Partial indexes so the expiry sweeper only scans links that can expire.
+    __table_args__ = (
+        Index(
+            "ix_links_expires_at",
+            "expires_at",
+            postgresql_where=(expires_at.isnot(None) & archived_at.is_(None)),
+        ),
+        Index(
+            "ix_links_max_clicks",
+            "id",
+            postgresql_where=(max_clicks.isnot(None) & archived_at.is_(None)),
+        ),
+    )
 
 
 class Click(Base):
     __tablename__ = "clicks"
-    id = Column(BigInteger, primary_key=True, index=True)
+    id = Column(BigIntegerPK, primary_key=True, index=True)
     link_id = Column(BigInteger, ForeignKey("links.id"), nullable=False, index=True)
     clicked_at = Column(
         TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
     )
     ip_address = Column(String(45), nullable=True)
     user_agent = Column(Text, nullable=True)
+    # Dimension IDs from app.user_agents, classified by the click worker.
+    browser_id = Column(SmallInteger, nullable=True)
+    os_id = Column(SmallInteger, nullable=True)
+    device_type_id = Column(SmallInteger, nullable=True)
+    is_bot = Column(Boolean, nullable=True)
+
+
+class ClickDimensionCount(Base):
+    """Pre-aggregated click counts per link and user agent dimension."""
+
+    __tablename__ = "click_dimension_counts"
+    link_id = Column(BigInteger, ForeignKey("links.id"), primary_key=True)
+    browser_id = Column(SmallInteger, primary_key=True)
+    os_id = Column(SmallInteger, primary_key=True)
+    device_type_id = Column(SmallInteger, primary_key=True)
+    is_bot = Column(Boolean, primary_key=True)
+    count = Column(BigInteger, default=0, nullable=False)
@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+from app import cache, crud, models, sharding, utils
+
+
+class RebalanceConflictError(Exception):
+    """Raised when a link's new shard already holds a different link with its code."""
+
+
+def _copy_row(row, **overrides):
+    """Copies an ORM row into a new, unsaved instance without its primary key."""
+    values = {
+        column.key: getattr(row, column.key)
+        for column in row.__table__.columns
+        if column.key != "id"
+    }
+    values.update(overrides)
+    return type(row)(**values)
+
+
+def _is_same_link(copy: models.Link, link: models.Link) -> bool:
+    """Checks whether a row on another shard is a copy of the given link."""
+    return (
+        copy.user_id == link.user_id
+        and copy.original_url == link.original_url
+        and utils.as_utc(copy.created_at) == utils.as_utc(link.created_at)
+    )
+
+
+async def move_link(
+    source: AsyncSession, link: models.Link, target_sessions: async_sessionmaker
+):
+    """
+    Copies a link with its clicks and counters to its new shard, then deletes
+    it from the old one. The copy is committed first, so an interrupted move
+    leaves the link on both shards and is finished by the next run. If the
+    new shard holds a different link under the same code, nothing is moved
+    and RebalanceConflictError is raised.
+
+    The link row is locked on the old shard for the whole move and re-read
+    under the lock, so clicks logged since the batch was loaded are copied
+    and clicks logged during the move wait for it and then retry on the new
+    shard.
+    """
+    result = await source.execute(
+        select(models.Link)
+        .where(models.Link.id == link.id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    link = result.scalar_one_or_none()
+    if link is None:
+        # Swept since the batch was loaded.
+        await source.commit()
+        return
+
+    async with target_sessions() as target:
+        existing_link = await crud.get_link_by_short_code(target, link.short_code)
+        if existing_link is not None and not _is_same_link(existing_link, link):
+            raise RebalanceConflictError(
+                f"Short code {link.short_code} is held by link {link.id} on its "
+                f"old shard and by a different link {existing_link.id} on its new "
+                "one. Resolve the conflict by hand and run the rebalance again."
+            )
+        if existing_link is None:
+            new_link = _copy_row(link)
+            target.add(new_link)
+            await target.flush()
+
+            clicks = await source.execute(
+                select(models.Click).where(models.Click.link_id == link.id)
+            )
+            target.add_all(
+                _copy_row(click, link_id=new_link.id) for click in clicks.scalars()
+            )
+            counts = await source.execute(
+                select(models.ClickDimensionCount).where(
+                    models.ClickDimensionCount.link_id == link.id
+                )
+            )
+            target.add_all(
+                _copy_row(count, link_id=new_link.id) for count in counts.scalars()
+            )
+            await target.commit()
+
+    await source.execute(delete(models.Click).where(models.Click.link_id == link.id))
+    await source.execute(
+        delete(models.ClickDimensionCount).where(
+            models.ClickDimensionCount.link_id == link.id
+        )
+    )
+    await source.execute(delete(models.Link).where(models.Link.id == link.id))
+    await source.commit()
+
+    # Cached entries hold the link's old ID.
+    try:
+        await cache.delete_links_from_cache([link.short_code])
+    except Exception as e:
+        print(f"Could not evict {link.short_code} from the cache: {e!r}")
+
+
+async def rebalance_shard(shard: int, batch_size: int, dry_run: bool) -> int:
+    """
+    Moves every link on a shard that the hash ring now assigns elsewhere.
+    Returns the number of links moved (or that would be moved).
+    """
+    moved = 0
+    last_id = 0
+    while True:
+        async with sharding.shard_sessions[shard]() as source:
+            result = await source.execute(
+                select(models.Link)
+                .where(models.Link.id > last_id)
+                .order_by(models.Link.id)
+                .limit(batch_size)
+            )
+            links = result.scalars().all()
+            if not links:
+                return moved
+            last_id = links[-1].id
+
+            for link in links:
+                target = sharding.router.shard_for(link.short_code)
+                if target == shard:
+                    continue
+                if not dry_run:
+                    await move_link(source, link, sharding.shard_sessions[target])
+                moved += 1
+
+
+async def rebalance(batch_size: int, dry_run: bool):
+    await cache.init_redis_pool()
+    try:
+        for shard in range(len(sharding.shard_sessions)):
+            moved = await rebalance_shard(shard, batch_size, dry_run)
+            action = "Would move" if dry_run else "Moved"
+            print(f"{action} {moved} links off shard {shard}")
+    finally:
+        await cache.close_redis_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move links and their clicks to the shards that now own them."
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    try:
+        asyncio.run(rebalance(batch_size=args.batch_size, dry_run=args.dry_run))
+    except RebalanceConflictError as e:
+        sys.exit(f"Rebalance stopped: {e}")
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from app.config import settings
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Guards calls to a dependency with a timeout budget and a failure counter.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    rejects calls immediately for `reset_timeout` seconds. It then lets a
+    single trial call through (half-open) and closes again if it succeeds.
+    `call_sync` runs on threadpool threads, so the state is guarded by a lock.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        failure_threshold: int = settings.CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = settings.CIRCUIT_RESET_SECONDS,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def _before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self._trial_in_flight):
+                raise CircuitOpenError(f"Circuit breaker '{self.name}' is open")
+            if state == "half_open":
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        Frees the half-open trial slot after a call that ended without a
+        verdict, such as a cancelled one, so the next call can be the trial.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"Circuit breaker '{self.name}' opened")
+                self.opened_at = time.monotonic()
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Awaits `func(*args, **kwargs)` within the breaker's timeout budget."""
+        self._before_call()
+        try:
+            result = await asyncio.wait_for(func(*args, **kwargs), self.timeout)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancellation says nothing about the dependency's health.
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+    def call_sync(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Calls a blocking `func(*args, **kwargs)`. The timeout cannot interrupt
+        it, so it must be enforced by the client; calls that overrun the budget
+        still count as failures.
+        """
+        self._before_call()
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release_trial()
+            raise
+        if time.monotonic() - started > self.timeout:
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failures": self.failures,
+            "timeout": self.timeout,
+        }
+
+
+cache_breaker = CircuitBreaker("redis_cache", timeout=settings.CACHE_TIMEOUT_SECONDS)
+broker_breaker = CircuitBreaker("redis_broker", timeout=settings.BROKER_TIMEOUT_SECONDS)
+
+# Database breakers are kept per shard, in app.sharding.
+breakers = (cache_breaker, broker_breaker)
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+
+from app import schemas, sharding
+from app.resilience import breakers
+
+router = APIRouter()
+
+
+@router.get("", response_model=schemas.HealthStatus)
+async def get_health():
+    breaker_states = [
+        breaker.to_dict() for breaker in (*breakers, *sharding.database_breakers)
+    ]
+    degraded = any(state["state"] != "closed" for state in breaker_states)
+    return {"status": "degraded" if degraded else "ok", "breakers": breaker_states}
@@ -1,18 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import crud, schemas, auth
-from app.database import SessionLocal
+from app import cache, crud, edge, schemas, sharded_crud, auth
 from app.dependencies import rate_limit_dependency
+from app.sharding import get_shard_db
 
 router = APIRouter()
 
 
-async def get_db():
-    async with SessionLocal() as session:
-        yield session
-
-
 @router.post(
     "",
     response_model=schemas.Link,
@@ -21,16 +18,23 @@ async def get_db():
 )
 async def create_short_link(
     link: schemas.LinkCreate,
-    db: AsyncSession = Depends(get_db),
     current_user: schemas.User = Depends(auth.get_current_user),
 ):
-    return await crud.create_short_link(db=db, link=link, user_id=current_user.id)
+    return await sharded_crud.create_short_link(link=link, user_id=current_user.id)
+
+
+@router.get("", response_model=List[schemas.Link])
+async def list_links(
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: schemas.User = Depends(auth.get_current_user),
+):
+    return await sharded_crud.get_links_by_user(user_id=current_user.id, limit=limit)
 
 
 @router.get("/{short_code}/analytics", response_model=schemas.LinkWithAnalytics)
 async def get_link_analytics_endpoint(
     short_code: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_shard_db),
     current_user: schemas.User = Depends(auth.get_current_user),
 ):
     db_link = await crud.get_link_by_short_code(db, short_code=short_code)
@@ -49,3 +53,23 @@ async def get_link_analytics_endpoint(
     response_data["analytics"] = analytics_data
 
     return response_data
+
+
+@router.post("/{short_code}/purge", status_code=status.HTTP_204_NO_CONTENT)
+async def purge_link_caches(
+    short_code: str,
+    db: AsyncSession = Depends(get_shard_db),
+    current_user: schemas.User = Depends(auth.get_current_user),
+):
+    db_link = await crud.get_link_by_short_code(db, short_code=short_code)
+
+    if db_link is None:
+        raise HTTPException(status_code=404, detail="Link not found")
+
+    if db_link.user_id != current_user.id:
+        raise HTTPException(
+            status_code=403, detail="Not authorized to purge caches for this link"
+        )
+
+    await cache.delete_links_from_cache([db_link.short_code])
+    await edge.purge_links([db_link.short_code])
@@ -1,17 +1,68 @@
-from pydantic import BaseModel, HttpUrl, EmailStr
-from typing import Union, List
-from datetime import date
+from pydantic import (
+    BaseModel,
+    HttpUrl,
+    EmailStr,
+    NonNegativeInt,
+    PositiveInt,
+    field_validator,
+    model_validator,
+)
+from typing import Literal, Union, List
+from datetime import date, datetime, timezone
+
+from app.config import settings
 
 
 class LinkCreate(BaseModel):
     original_url: HttpUrl
+    expires_at: Union[datetime, None] = None
+    max_clicks: Union[PositiveInt, None] = None
+    redirect_status: Literal[301, 302, 307, 308] = 307
+    cache_max_age: Union[NonNegativeInt, None] = None
+
+    @field_validator("expires_at")
+    @classmethod
+    def expires_at_in_future(cls, value: Union[datetime, None]):
+        if value is None:
+            return value
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = value.astimezone(timezone.utc)
+        if value <= datetime.now(timezone.utc):
+            raise ValueError("expires_at must be in the future")
+        return value
+
+    @model_validator(mode="after")
+    def click_limited_links_are_not_cached(self):
+        # Every visit to a click-limited link has to reach us to be counted.
+        if self.max_clicks is not None and self.cache_max_age is not None:
+            raise ValueError("cache_max_age cannot be combined with max_clicks")
+        # Browsers may cache permanent redirects indefinitely.
+        if self.max_clicks is not None and self.redirect_status in (301, 308):
+            raise ValueError(
+                "redirect_status 301 and 308 cannot be combined with max_clicks"
+            )
+        return self
 
 
 class Link(BaseModel):
-    id: int
+    id: Union[int, None] = None
     short_code: str
     original_url: HttpUrl
     visit_count: int
+    expires_at: Union[datetime, None] = None
+    max_clicks: Union[int, None] = None
+    redirect_status: int = 307
+    cache_max_age: Union[int, None] = None
+
+    @field_validator("id")
+    @classmethod
+    def hide_shard_row_ids(cls, value: Union[int, None]):
+        # Row IDs repeat across shards, so with sharding enabled links are
+        # only identified by their short code.
+        if settings.SHARD_DATABASE_URLS:
+            return None
+        return value
 
     class Config:
         from_attributes = True
@@ -44,10 +95,31 @@ class DailyClicks(BaseModel):
     count: int
 
 
+class BreakdownItem(BaseModel):
+    name: str
+    count: int
+
+
 class AnalyticsData(BaseModel):
     total_clicks: int
+    bot_clicks: int
     clicks_by_day: List[DailyClicks]
+    browsers: List[BreakdownItem]
+    operating_systems: List[BreakdownItem]
+    device_types: List[BreakdownItem]
 
 
 class LinkWithAnalytics(Link):
     analytics: AnalyticsData
+
+
+class BreakerState(BaseModel):
+    name: str
+    state: str
+    failures: int
+    timeout: float
+
+
+class HealthStatus(BaseModel):
+    status: str
+    breakers: List[BreakerState]
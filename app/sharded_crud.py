@@ -0,0 +1,106 @@
+import heapq
+from datetime import datetime
+from typing import List, Union
+
+from app import crud, models, schemas, sharding, utils, user_agents
+
+
+async def get_link_by_short_code(short_code: str):
+    """
+    Fetches a link from the shard holding it, falling back to its previous
+    owner while a rebalance is pending. Each shard is queried through its
+    own circuit breaker, whose errors are raised.
+    """
+    for shard in sharding.shards_for(short_code):
+        async with sharding.shard_sessions[shard]() as db:
+            link = await sharding.database_breakers[shard].call(
+                crud.get_link_by_short_code, db, short_code=short_code
+            )
+        if link is not None:
+            return link
+    return None
+
+
+async def is_short_code_taken(short_code: str) -> bool:
+    """Checks every shard that may hold a short code for it."""
+    return await get_link_by_short_code(short_code) is not None
+
+
+async def create_short_link(
+    link: schemas.LinkCreate, user_id: Union[int, None] = None
+) -> models.Link:
+    """
+    Creates a new short link on the shard that owns its short code. Each
+    collision candidate is checked on its own shard, since salting the code
+    can move it to a different one.
+    """
+    original_url = str(link.original_url)
+
+    # An existing link for the same URL may hold a salted code, which can
+    # live on any shard, so every shard is checked.
+    if link.expires_at is None and link.max_clicks is None:
+        existing_links = await sharding.fan_out(
+            crud.get_link_by_original_url,
+            original_url,
+            redirect_status=link.redirect_status,
+            cache_max_age=link.cache_max_age,
+        )
+        for existing_link in existing_links:
+            if existing_link:
+                return existing_link
+
+    short_code = utils.generate_short_code(original_url)
+    collision_count = 0
+    while await is_short_code_taken(short_code):
+        collision_count += 1
+        short_code = utils.generate_short_code(original_url, str(collision_count))
+
+    async with sharding.get_session(short_code) as db:
+        return await crud.insert_link(db, link, short_code, user_id)
+
+
+async def log_click_to_db(
+    short_code: str,
+    ip_address: str,
+    user_agent: str,
+    user_agent_info: user_agents.UserAgentInfo,
+    clicked_at: Union[datetime, None] = None,
+):
+    """
+    Logs a click on the shard holding the short code, falling back to its
+    previous owner while a rebalance is pending. The link is looked up by code
+    rather than by a cached ID, since IDs change when a link is moved between
+    shards. Returns the updated link, or None.
+    """
+    shards = sharding.shards_for(short_code)
+    if len(shards) > 1:
+        # A click on the previous owner fails if the link is moved meanwhile,
+        # so the owner is checked once more after it.
+        shards.append(shards[0])
+    for shard in shards:
+        async with sharding.shard_sessions[shard]() as db:
+            link = await crud.get_link_by_short_code(db, short_code=short_code)
+            if link is None:
+                continue
+            logged_link = await crud.log_click_to_db(
+                db=db,
+                link_id=link.id,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                user_agent_info=user_agent_info,
+                clicked_at=clicked_at,
+            )
+        if logged_link is not None or shard == shards[0]:
+            return logged_link
+    return None
+
+
+async def get_links_by_user(user_id: int, limit: int) -> List[models.Link]:
+    """Fetches a user's most recent links from all shards and merges them."""
+    shard_results = await sharding.fan_out(crud.get_links_by_user, user_id, limit)
+    merged = heapq.merge(
+        *shard_results,
+        key=lambda link: utils.as_utc(link.created_at),
+        reverse=True,
+    )
+    return list(merged)[:limit]
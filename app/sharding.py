@@ -0,0 +1,156 @@
+import asyncio
+import bisect
+import hashlib
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from app import crud
+from app.config import settings
+from app.database import SessionLocal
+from app.resilience import CircuitBreaker
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+class ShardRouter:
+    """
+    Maps short codes to shard indexes with a consistent hash ring.
+
+    Each shard owns `virtual_nodes` points on the ring, so appending a shard
+    only moves roughly 1/N of the short codes. Shards are identified by their
+    position in SHARD_DATABASE_URLS, so new shards must be appended.
+    """
+
+    def __init__(self, shard_count: int, virtual_nodes: int):
+        self.shard_count = shard_count
+        ring = sorted(
+            (_hash(f"shard-{shard}#{vnode}"), shard)
+            for shard in range(shard_count)
+            for vnode in range(virtual_nodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._shards = [shard for _, shard in ring]
+
+    def shard_for(self, short_code: str) -> int:
+        index = bisect.bisect(self._points, _hash(short_code)) % len(self._points)
+        return self._shards[index]
+
+
+def _create_shard_sessions() -> List[async_sessionmaker]:
+    """
+    Creates a session factory per configured shard. Without any shards
+    configured, the primary database is the only shard.
+    """
+    if not settings.SHARD_DATABASE_URLS:
+        return [SessionLocal]
+
+    sessions = []
+    for url in settings.SHARD_DATABASE_URLS:
+        if url == settings.DATABASE_URL:
+            sessions.append(SessionLocal)
+            continue
+        shard_engine = create_async_engine(
+            url,
+            echo=True,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT_SECONDS,
+        )
+        sessions.append(async_sessionmaker(shard_engine, expire_on_commit=False))
+    return sessions
+
+
+def _create_previous_router(shard_count: int) -> Optional[ShardRouter]:
+    """
+    Creates the ring used before the last shards were appended, if a
+    rebalance is still pending.
+    """
+    previous_count = settings.SHARD_PREVIOUS_COUNT
+    if previous_count is None:
+        return None
+    if not 0 < previous_count < shard_count:
+        raise ValueError(
+            f"SHARD_PREVIOUS_COUNT must be between 1 and {shard_count - 1}, "
+            f"got {previous_count}"
+        )
+    if previous_count == 1 and settings.SHARD_DATABASE_URLS[0] != settings.DATABASE_URL:
+        # With one previous shard, every link is looked up on the first one.
+        print(
+            "Warning: SHARD_PREVIOUS_COUNT is 1 but the first shard is not "
+            "DATABASE_URL, so links created before sharding was enabled will "
+            "not be found unless the first shard holds them."
+        )
+    return ShardRouter(previous_count, settings.SHARD_VIRTUAL_NODES)
+
+
+shard_sessions = _create_shard_sessions()
+router = ShardRouter(len(shard_sessions), settings.SHARD_VIRTUAL_NODES)
+previous_router = _create_previous_router(len(shard_sessions))
+# One breaker per shard, so a slow shard only fails the codes it owns.
+database_breakers = [
+    CircuitBreaker(f"postgres_shard_{shard}", timeout=settings.DATABASE_TIMEOUT_SECONDS)
+    for shard in range(len(shard_sessions))
+]
+
+
+def shards_for(short_code: str) -> List[int]:
+    """
+    Returns the shards that may hold a short code: its owner, followed by
+    its previous owner while a rebalance is pending and it has not moved yet.
+    """
+    shards = [router.shard_for(short_code)]
+    if previous_router is not None:
+        previous_shard = previous_router.shard_for(short_code)
+        if previous_shard != shards[0]:
+            shards.append(previous_shard)
+    return shards
+
+
+def get_session(short_code: str) -> AsyncSession:
+    """Opens a session on the shard that owns a short code."""
+    return shard_sessions[router.shard_for(short_code)]()
+
+
+async def locate_shard(short_code: str) -> int:
+    """
+    Finds the shard holding a short code. Falls back to its owner if no
+    shard holds it, which is also where it would be created.
+    """
+    shards = shards_for(short_code)
+    if len(shards) > 1:
+        for shard in shards:
+            async with shard_sessions[shard]() as db:
+                if await crud.get_link_by_short_code(db, short_code=short_code):
+                    return shard
+    return shards[0]
+
+
+async def get_shard_db(short_code: str):
+    """
+    Dependency that yields a session on the shard holding the request's
+    `short_code` path parameter.
+    """
+    async with shard_sessions[await locate_shard(short_code)]() as session:
+        yield session
+
+
+async def fan_out(func: Callable, *args, **kwargs) -> List[Any]:
+    """
+    Runs `func(db, *args, **kwargs)` on every shard concurrently and returns
+    the results in shard order.
+    """
+
+    async def run_on_shard(session_factory: async_sessionmaker):
+        async with session_factory() as db:
+            return await func(db, *args, **kwargs)
+
+    return await asyncio.gather(
+        *(run_on_shard(session_factory) for session_factory in shard_sessions)
+    )
@@ -0,0 +1,301 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.future import select
+
+from app import models, utils
+from app.config import settings
+from app.sharding import shard_sessions
+
+# Snapshot file layout (all integers little-endian):
+#   header:  magic, entry count, creation time (unix seconds)
+#   entries: fixed-width records sorted by short code hash
+#   data:    short code and original URL bytes referenced by the entries
+# The file is never modified in place, so it can be memory-mapped read-only and
+# shared through the page cache by every worker process on the host.
+SNAPSHOT_MAGIC = b"USNAP\x00\x00\x02"
+HEADER = struct.Struct("<8sQQ")
+# code hash, link id, data offset, code length, url length,
+# expires at (0 = never), redirect status, cache max-age (-1 = not cacheable)
+ENTRY = struct.Struct("<QQQIIqHxxi")
+
+
+class SnapshotEntry(NamedTuple):
+    link_id: int
+    original_url: str
+    expires_at: Optional[int]
+    redirect_status: int
+    cache_max_age: Optional[int]
+
+
+def hash_short_code(short_code: bytes) -> int:
+    """Stable 64-bit hash used to order and search snapshot entries."""
+    return int.from_bytes(hashlib.blake2b(short_code, digest_size=8).digest(), "little")
+
+
+def write_snapshot(
+    path: str, links: List[Tuple[str, int, str, int, int, Optional[int]]]
+) -> int:
+    """
+    Compiles (short_code, link_id, original_url, expires_at, redirect_status,
+    cache_max_age) rows into a snapshot file. The file is written next to the
+    target and renamed into place, so readers only ever see a complete snapshot.
+    Returns the number of entries written.
+    """
+    records = []
+    for short_code, link_id, original_url, expires_at, status, max_age in links:
+        code = short_code.encode("utf-8")
+        records.append(
+            (
+                hash_short_code(code),
+                code,
+                link_id,
+                original_url.encode("utf-8"),
+                expires_at,
+                status,
+                -1 if max_age is None else max_age,
+            )
+        )
+    records.sort(key=lambda record: (record[0], record[1]))
+
+    data_start = HEADER.size + ENTRY.size * len(records)
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+        try:
+            tmp.write(HEADER.pack(SNAPSHOT_MAGIC, len(records), int(time.time())))
+            offset = data_start
+            for code_hash, code, link_id, url, expires_at, status, max_age in records:
+                tmp.write(
+                    ENTRY.pack(
+                        code_hash,
+                        link_id,
+                        offset,
+                        len(code),
+                        len(url),
+                        expires_at,
+                        status,
+                        max_age,
+                    )
+                )
+                offset += len(code) + len(url)
+            for _, code, _, url, _, _, _ in records:
+                tmp.write(code)
+                tmp.write(url)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+    os.chmod(tmp.name, 0o644)
+    os.replace(tmp.name, path)
+    return len(records)
+
+
+async def export_snapshot(path: str) -> int:
+    """
+    Exports every link on every shard that can be resolved without the
+    database into a snapshot file. Links with click limits are left out, since
+    they need the live visit count.
+    """
+    now = datetime.now(timezone.utc)
+    query = (
+        select(
+            models.Link.short_code,
+            models.Link.id,
+            models.Link.original_url,
+            models.Link.expires_at,
+            models.Link.redirect_status,
+            models.Link.cache_max_age,
+        )
+        .where(models.Link.archived_at.is_(None))
+        .where(models.Link.max_clicks.is_(None))
+        .where(or_(models.Link.expires_at.is_(None), models.Link.expires_at > now))
+        .execution_options(yield_per=10000)
+    )
+
+    links = []
+    for session_factory in shard_sessions:
+        async with session_factory() as db:
+            result = await db.stream(query)
+            async for row in result:
+                expires_at = row.expires_at
+                links.append(
+                    (
+                        row.short_code,
+                        row.id,
+                        row.original_url,
+                        int(utils.as_utc(expires_at).timestamp()) if expires_at else 0,
+                        row.redirect_status,
+                        row.cache_max_age,
+                    )
+                )
+
+    return write_snapshot(path, links)
+
+
+class LinkSnapshot:
+    """A read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            if self.stat.st_size < HEADER.size:
+                raise ValueError(f"{path} is too small to be a link snapshot")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._validate(path)
+        except ValueError:
+            self._mmap.close()
+            raise
+
+    def _validate(self, path: str):
+        """
+        Checks the magic and that the file is exactly as long as its entries
+        say, so truncated files and other format versions are never served.
+        """
+        magic, self.count, self.created_at = HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a link snapshot in this format")
+
+        size = len(self._mmap)
+        expected_size = HEADER.size + self.count * ENTRY.size
+        if expected_size > size:
+            raise ValueError(f"{path} is truncated")
+        if self.count:
+            # Data is written in entry order, so the last entry ends the file.
+            _, _, offset, code_len, url_len, *_ = self._entry(self.count - 1)
+            expected_size = offset + code_len + url_len
+        if expected_size != size:
+            raise ValueError(
+                f"{path} is {size} bytes, but its entries need {expected_size}"
+            )
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int, int, int, int, int]:
+        return ENTRY.unpack_from(self._mmap, HEADER.size + index * ENTRY.size)
+
+    def lookup(self, short_code: str) -> Optional[SnapshotEntry]:
+        code = short_code.encode("utf-8")
+        code_hash = hash_short_code(code)
+
+        # Binary search for the first entry with a matching hash.
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._entry(mid)[0] < code_hash:
+                low = mid + 1
+            else:
+                high = mid
+
+        for index in range(low, self.count):
+            (
+                entry_hash,
+                link_id,
+                offset,
+                code_len,
+                url_len,
+                expires_at,
+                redirect_status,
+                cache_max_age,
+            ) = self._entry(index)
+            if entry_hash != code_hash:
+                break
+            if self._mmap[offset : offset + code_len] == code:
+                url_start = offset + code_len
+                original_url = self._mmap[url_start : url_start + url_len]
+                return SnapshotEntry(
+                    link_id=link_id,
+                    original_url=original_url.decode("utf-8"),
+                    expires_at=expires_at or None,
+                    redirect_status=redirect_status,
+                    cache_max_age=None if cache_max_age < 0 else cache_max_age,
+                )
+        return None
+
+    def close(self):
+        self._mmap.close()
+
+
+_snapshot: Optional[LinkSnapshot] = None
+_last_reload_check = 0.0
+# Identity of the last file that failed to load.
+_rejected_stat: Optional[Tuple[int, int, int]] = None
+
+
+def load_snapshot():
+    """
+    Opens the configured snapshot, replacing the current one if the file on
+    disk has been swapped for a new export since it was last opened. A file
+    that cannot be opened or fails validation is logged and skipped, and the
+    current snapshot (if any) stays in use.
+    """
+    global _snapshot, _last_reload_check, _rejected_stat
+    _last_reload_check = time.monotonic()
+    try:
+        stat = os.stat(settings.SNAPSHOT_PATH)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        print(f"Could not stat link snapshot: {e!r}")
+        return
+    file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _snapshot is not None and file_id == (
+        _snapshot.stat.st_ino,
+        _snapshot.stat.st_mtime_ns,
+        _snapshot.stat.st_size,
+    ):
+        return
+    if file_id == _rejected_stat:
+        return
+
+    try:
+        loaded = LinkSnapshot(settings.SNAPSHOT_PATH)
+    except (OSError, ValueError) as e:
+        # Only log a bad file once, not on every reload check.
+        _rejected_stat = file_id
+        print(f"Ignoring invalid link snapshot: {e!r}")
+        return
+
+    previous, _snapshot = _snapshot, loaded
+    print(f"Loaded link snapshot with {_snapshot.count} links")
+    if previous is not None:
+        previous.close()
+
+
+def close_snapshot():
+    global _snapshot
+    if _snapshot is not None:
+        _snapshot.close()
+        _snapshot = None
+
+
+def get_link_from_snapshot(short_code: str) -> Optional[SnapshotEntry]:
+    """
+    Resolves a short code from the snapshot, if snapshot mode is enabled.
+    Expired entries are treated as missing.
+    """
+    if settings.SNAPSHOT_MODE == "off":
+        return None
+    if time.monotonic() - _last_reload_check >= settings.SNAPSHOT_RELOAD_SECONDS:
+        load_snapshot()
+    if _snapshot is None:
+        return None
+
+    entry = _snapshot.lookup(short_code)
+    if entry and entry.expires_at and entry.expires_at <= time.time():
+        return None
+    return entry
+
+
+if __name__ == "__main__":
+    output_path = sys.argv[1] if len(sys.argv) > 1 else settings.SNAPSHOT_PATH
+    exported = asyncio.run(export_snapshot(output_path))
+    print(f"Exported {exported} links to {output_path}")
@@ -0,0 +1,54 @@
+import asyncio
+
+from app import cache, crud, edge, sharding
+from app.config import settings
+
+
+async def sweep_expired_links() -> int:
+    """
+    Sweeps expired links on every shard in small batches until none are left.
+    Returns the total number of links swept.
+    """
+    archive = settings.LINK_SWEEP_ACTION == "archive"
+    total_swept = 0
+    for session_factory in sharding.shard_sessions:
+        while True:
+            async with session_factory() as db:
+                short_codes = await crud.sweep_expired_links(
+                    db, batch_size=settings.LINK_SWEEP_BATCH_SIZE, archive=archive
+                )
+            # The batch is already committed, so a Redis error must not stop
+            # the sweep. Entries left behind still expire with their TTL.
+            try:
+                await cache.delete_links_from_cache(short_codes)
+            except Exception as e:
+                print(f"Could not evict {len(short_codes)} swept links: {e!r}")
+            await edge.purge_links(short_codes)
+            total_swept += len(short_codes)
+            if len(short_codes) < settings.LINK_SWEEP_BATCH_SIZE:
+                break
+    return total_swept
+
+
+async def run_sweeper():
+    """Runs the expired link sweeper forever at a fixed interval."""
+    await cache.init_redis_pool()
+    try:
+        while True:
+            try:
+                swept = await sweep_expired_links()
+            except Exception as e:
+                # Retried on the next interval.
+                print(f"Sweep failed: {e!r}")
+            else:
+                if swept:
+                    print(
+                        f"Sweeper {settings.LINK_SWEEP_ACTION}d {swept} expired links"
+                    )
+            await asyncio.sleep(settings.LINK_SWEEP_INTERVAL_SECONDS)
+    finally:
+        await cache.close_redis_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_sweeper())
@@ -1,19 +1,203 @@
+import fcntl
+import glob
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Union
+
 import dramatiq
 from dramatiq.brokers.redis import RedisBroker
 from dramatiq.middleware import AsyncIO
 from app.config import settings
 from app.database import SessionLocal
-from app import crud
+from app import cache, click_filter, crud, sharded_crud, user_agents
+from app.resilience import broker_breaker
 
-redis_broker = RedisBroker(url=settings.REDIS_URL, middleware=[AsyncIO()])
+redis_broker = RedisBroker(
+    url=settings.REDIS_URL,
+    middleware=[AsyncIO()],
+    socket_connect_timeout=settings.BROKER_TIMEOUT_SECONDS,
+    socket_timeout=settings.BROKER_TIMEOUT_SECONDS,
+)
 dramatiq.set_broker(redis_broker)
 
 
 @dramatiq.actor
-async def log_click_task(link_id: int, ip_address: str, user_agent: str):
+async def log_click_task(
+    link_id: int,
+    ip_address: str,
+    user_agent: str,
+    short_code: Union[str, None] = None,
+    clicked_at: Union[float, None] = None,
+):
     print(f"Worker received job: Log click for link_id {link_id}")
-    async with SessionLocal() as db:
-        await crud.log_click_to_db(
-            db=db, link_id=link_id, ip_address=ip_address, user_agent=user_agent
+    user_agent_info = user_agents.classify_user_agent(user_agent)
+    if user_agent_info.is_bot and settings.BOT_CLICK_POLICY == "drop":
+        print(f"Worker dropped bot click for link_id {link_id}")
+        return
+    if await click_filter.is_duplicate_click(
+        short_code or link_id, ip_address, clicked_at
+    ):
+        print(f"Worker dropped duplicate click for link_id {link_id}")
+        return
+    # Messages enqueued before clicks were timestamped are logged as of now.
+    click_time = None
+    if clicked_at is not None:
+        click_time = datetime.fromtimestamp(clicked_at, timezone.utc)
+
+    if short_code is not None:
+        link = await sharded_crud.log_click_to_db(
+            short_code=short_code,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            user_agent_info=user_agent_info,
+            clicked_at=click_time,
         )
+    else:
+        # Messages enqueued before sharding only carry the link ID.
+        async with SessionLocal() as db:
+            link = await crud.log_click_to_db(
+                db=db,
+                link_id=link_id,
+                ip_address=ip_address,
+                user_agent=user_agent,
+                user_agent_info=user_agent_info,
+                clicked_at=click_time,
+            )
+    # Links that just hit their click limit must stop resolving from the cache.
+    if link is not None and crud.is_link_expired(link):
+        await cache.init_redis_pool()
+        await cache.delete_links_from_cache([link.short_code])
     print(f"Worker finished job for link_id {link_id}")
+
+
+def send_click(
+    link_id: int, ip_address: str, user_agent: str, short_code: str, clicked_at: float
+):
+    """
+    Enqueues a click, made at the Unix time `clicked_at`, through the broker's
+    circuit breaker, spooling it to a local file instead if the broker is slow
+    or unavailable. Enqueueing blocks on the broker's socket, so this must not
+    run on the event loop.
+    """
+    click = [link_id, ip_address, user_agent, short_code, clicked_at]
+    try:
+        broker_breaker.call_sync(log_click_task.send, *click)
+    except Exception as e:
+        print(f"Spooling click for link_id {link_id}: {e!r}")
+        spool_click(click)
+
+
+@contextmanager
+def _locked_spool():
+    """Serializes spool appends against the spool being renamed for replay."""
+    with open(f"{settings.CLICK_SPOOL_PATH}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def spool_click(click: list):
+    with _locked_spool():
+        with open(settings.CLICK_SPOOL_PATH, "a", encoding="utf-8") as spool:
+            spool.write(json.dumps(click) + "\n")
+
+
+def _replay_path() -> str:
+    return f"{settings.CLICK_SPOOL_PATH}.{os.getpid()}.replay"
+
+
+def _lock_orphaned_replay_file(path: str):
+    """
+    Opens and locks a replay file whose process has exited, as the lock is
+    released with it. Returns None if the file is still locked or was
+    claimed by another process in the meantime.
+    """
+    try:
+        replay = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(replay, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if os.path.samestat(os.fstat(replay.fileno()), os.stat(path)):
+            return replay
+    except (BlockingIOError, FileNotFoundError):
+        pass
+    replay.close()
+    return None
+
+
+def _claim_replay_file():
+    """
+    Claims a file of spooled clicks for this process to replay, keeping it
+    locked until every click in it has been enqueued. Replay files left by
+    processes that exited are adopted first, then the spool itself is taken.
+    """
+    replay_path = _replay_path()
+    pattern = f"{glob.escape(settings.CLICK_SPOOL_PATH)}.*.replay"
+    for path in sorted(glob.glob(pattern)):
+        replay = _lock_orphaned_replay_file(path)
+        if replay is not None:
+            if path != replay_path:
+                print(f"Adopting orphaned spooled clicks from {path}")
+                os.rename(path, replay_path)
+            return replay
+
+    with _locked_spool():
+        try:
+            replay = open(settings.CLICK_SPOOL_PATH, encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        fcntl.flock(replay, fcntl.LOCK_EX)
+        os.rename(settings.CLICK_SPOOL_PATH, replay_path)
+    return replay
+
+
+# The replay file this process is working through, locked while it is open.
+_replay_file = None
+
+
+def replay_spooled_clicks(batch_size: int) -> int:
+    """
+    Re-enqueues up to `batch_size` spooled clicks. The spool is renamed to a
+    per-process replay file before it is read, so only one process replays it
+    and new clicks start a fresh spool. The replay file is worked through
+    across calls and removed once every click in it has been enqueued; if the
+    process exits first, another one adopts the file and replays it from the
+    start, so some of its clicks may be enqueued twice.
+    Like send_click, this blocks and must not run on the event loop.
+    Returns the number of clicks replayed.
+    """
+    global _replay_file
+    if _replay_file is None:
+        _replay_file = _claim_replay_file()
+        if _replay_file is None:
+            return 0
+
+    replay = _replay_file
+    replayed = 0
+    while replayed < batch_size:
+        offset = replay.tell()
+        line = replay.readline()
+        if not line:
+            break
+        try:
+            click = json.loads(line)
+        except ValueError:
+            print(f"Dropping malformed spooled click: {line!r}")
+            continue
+        try:
+            broker_breaker.call_sync(log_click_task.send, *click)
+        except Exception:
+            # Retried from this click on the next call.
+            replay.seek(offset)
+            return replayed
+        replayed += 1
+    else:
+        # The batch is full; the rest is replayed on the next call.
+        return replayed
+
+    os.unlink(_replay_path())
+    replay.close()
+    _replay_file = None
+    return replayed
@@ -0,0 +1,111 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+from app.config import settings
+
+# Dimension tables for user agent classification. The position of each name is
+# the ID stored on clicks, so new entries must only ever be appended.
+BROWSERS = (
+    "Other",
+    "Chrome",
+    "Firefox",
+    "Safari",
+    "Edge",
+    "Opera",
+    "Samsung Internet",
+    "Internet Explorer",
+    "Bot",
+)
+OPERATING_SYSTEMS = ("Other", "Windows", "macOS", "iOS", "Android", "Linux", "ChromeOS")
+DEVICE_TYPES = ("Other", "Desktop", "Mobile", "Tablet", "Bot")
+
+_BOT_PATTERN = re.compile(
+    r"bot|crawl|spider|slurp|scrape|preview|facebookexternalhit|embedly|"
+    r"whatsapp|curl/|wget/|python-requests|python-urllib|httpx|go-http-client|"
+    r"okhttp|headless",
+    re.IGNORECASE,
+)
+
+# Order matters: most browsers also claim to be Chrome and/or Safari.
+_BROWSER_PATTERNS = (
+    (re.compile(r"Edg(e|A|iOS)?/"), BROWSERS.index("Edge")),
+    (re.compile(r"OPR/|Opera"), BROWSERS.index("Opera")),
+    (re.compile(r"SamsungBrowser/"), BROWSERS.index("Samsung Internet")),
+    (re.compile(r"Firefox/|FxiOS/"), BROWSERS.index("Firefox")),
+    (re.compile(r"Chrome/|CriOS/|Chromium/"), BROWSERS.index("Chrome")),
+    (re.compile(r"MSIE |Trident/"), BROWSERS.index("Internet Explorer")),
+    (re.compile(r"Safari/"), BROWSERS.index("Safari")),
+)
+
+# iOS and Android must be checked before macOS and Linux respectively.
+_OS_PATTERNS = (
+    (re.compile(r"Windows"), OPERATING_SYSTEMS.index("Windows")),
+    (re.compile(r"iPhone|iPad|iPod"), OPERATING_SYSTEMS.index("iOS")),
+    (re.compile(r"Android"), OPERATING_SYSTEMS.index("Android")),
+    (re.compile(r"CrOS"), OPERATING_SYSTEMS.index("ChromeOS")),
+    (re.compile(r"Mac OS X|Macintosh"), OPERATING_SYSTEMS.index("macOS")),
+    (re.compile(r"Linux"), OPERATING_SYSTEMS.index("Linux")),
+)
+
+_TABLET_PATTERN = re.compile(r"iPad|Tablet|Android(?!.*Mobile)")
+_MOBILE_PATTERN = re.compile(r"Mobi|iPhone|iPod|Android")
+_DESKTOP_OS_IDS = frozenset(
+    OPERATING_SYSTEMS.index(name) for name in ("Windows", "macOS", "Linux", "ChromeOS")
+)
+
+
+class UserAgentInfo(NamedTuple):
+    browser_id: int
+    os_id: int
+    device_type_id: int
+    is_bot: bool
+
+
+def _match(patterns, user_agent: str) -> int:
+    for pattern, dimension_id in patterns:
+        if pattern.search(user_agent):
+            return dimension_id
+    return 0
+
+
+@lru_cache(maxsize=settings.USER_AGENT_CACHE_SIZE)
+def classify_user_agent(user_agent: str) -> UserAgentInfo:
+    """
+    Classifies a raw User-Agent header into browser, OS and device type IDs.
+
+    Results are memoized in a bounded LRU cache, since a small number of
+    user agent strings make up the bulk of redirect traffic.
+    """
+    os_id = _match(_OS_PATTERNS, user_agent)
+
+    if not user_agent or _BOT_PATTERN.search(user_agent):
+        return UserAgentInfo(
+            browser_id=BROWSERS.index("Bot"),
+            os_id=os_id,
+            device_type_id=DEVICE_TYPES.index("Bot"),
+            is_bot=True,
+        )
+
+    if _TABLET_PATTERN.search(user_agent):
+        device_type_id = DEVICE_TYPES.index("Tablet")
+    elif _MOBILE_PATTERN.search(user_agent):
+        device_type_id = DEVICE_TYPES.index("Mobile")
+    elif os_id in _DESKTOP_OS_IDS:
+        device_type_id = DEVICE_TYPES.index("Desktop")
+    else:
+        device_type_id = DEVICE_TYPES.index("Other")
+
+    return UserAgentInfo(
+        browser_id=_match(_BROWSER_PATTERNS, user_agent),
+        os_id=os_id,
+        device_type_id=device_type_id,
+        is_bot=False,
+    )
+
+
+def dimension_name(names: tuple, dimension_id: int) -> str:
+    """Maps a stored dimension ID back to its display name."""
+    if 0 <= dimension_id < len(names):
+        return names[dimension_id]
+    return names[0]
@@ -1,5 +1,6 @@
 import hashlib
 import base64
+from datetime import datetime, timezone
 
 
 def generate_short_code(url: str, salt: str = "") -> str:
@@ -21,3 +22,13 @@ def generate_short_code(url: str, salt: str = "") -> str:
     short_code = b64_encoded.decode("utf-8")[:7]
 
     return short_code
+
+
+def as_utc(value: datetime) -> datetime:
+    """
+    Returns a timezone-aware UTC datetime. Naive values, as returned by SQLite,
+    are assumed to already be in UTC.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
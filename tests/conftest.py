@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# The settings are read when the app modules are first imported, so the test
+# environment has to be in place before any of them are collected. Shard
+# tests swap in their own SQLite databases, so the primary one is only migrated.
+_primary_database = os.path.join(tempfile.gettempdir(), "url-shrinker-tests.db")
+os.environ.update(
+    DATABASE_URL=f"sqlite+aiosqlite:///{_primary_database}",
+    SYNC_DATABASE_URL=f"sqlite:///{_primary_database}",
+    JWT_SECRET_KEY="test-secret-key",
+    REDIS_URL="redis://localhost:6379/15",
+    POSTGRES_USER="postgres",
+    POSTGRES_PASSWORD="password",
+    POSTGRES_DB="url-shrinker",
+    SHARD_DATABASE_URLS="[]",
+)
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """Sessions on a fresh SQLite database with every table created."""
+    from app.database import Base
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db(session_factory):
+    async with session_factory() as session:
+        yield session
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import crud, schemas
+from app.user_agents import (
+    BROWSERS,
+    DEVICE_TYPES,
+    OPERATING_SYSTEMS,
+    classify_user_agent,
+    dimension_name,
+)
+
+CHROME_WINDOWS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+SAFARI_IPHONE = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+)
+FIREFOX_LINUX = "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0"
+EDGE_MAC = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
+)
+SAMSUNG_TABLET = (
+    "Mozilla/5.0 (Linux; Android 13; SM-X700) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) SamsungBrowser/23.0 Chrome/115.0.0.0 Safari/537.36"
+)
+GOOGLEBOT = "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
+
+
+def names(user_agent):
+    info = classify_user_agent(user_agent)
+    return (
+        dimension_name(BROWSERS, info.browser_id),
+        dimension_name(OPERATING_SYSTEMS, info.os_id),
+        dimension_name(DEVICE_TYPES, info.device_type_id),
+        info.is_bot,
+    )
+
+
+@pytest.mark.parametrize(
+    "user_agent, expected",
+    [
+        (CHROME_WINDOWS, ("Chrome", "Windows", "Desktop", False)),
+        (SAFARI_IPHONE, ("Safari", "iOS", "Mobile", False)),
+        (FIREFOX_LINUX, ("Firefox", "Linux", "Desktop", False)),
+        (EDGE_MAC, ("Edge", "macOS", "Desktop", False)),
+        (SAMSUNG_TABLET, ("Samsung Internet", "Android", "Tablet", False)),
+        (GOOGLEBOT, ("Bot", "Other", "Bot", True)),
+        ("curl/8.4.0", ("Bot", "Other", "Bot", True)),
+        ("", ("Bot", "Other", "Bot", True)),
+        ("SomethingElse/1.0", ("Other", "Other", "Other", False)),
+    ],
+)
+def test_classify_user_agent(user_agent, expected):
+    assert names(user_agent) == expected
+
+
+def test_unknown_dimension_ids_fall_back_to_other():
+    assert dimension_name(BROWSERS, len(BROWSERS)) == "Other"
+
+
+async def log_click(db, link_id, user_agent):
+    info = classify_user_agent(user_agent)
+    assert await crud.log_click_to_db(db, link_id, "10.0.0.1", user_agent, info)
+
+
+async def test_breakdowns_add_up_to_human_clicks(db):
+    link = await crud.insert_link(
+        db, schemas.LinkCreate(original_url="https://example.com/"), "abc1234"
+    )
+    for user_agent in [CHROME_WINDOWS] * 3 + [SAFARI_IPHONE] * 2 + [FIREFOX_LINUX]:
+        await log_click(db, link.id, user_agent)
+    # Flagged bot clicks, as stored with BOT_CLICK_POLICY=flag.
+    for user_agent in [GOOGLEBOT, "curl/8.4.0"]:
+        await log_click(db, link.id, user_agent)
+
+    analytics = await crud.get_link_analytics(db, link.id)
+
+    assert analytics.total_clicks == 6
+    assert analytics.bot_clicks == 2
+    assert sum(day.count for day in analytics.clicks_by_day) == 6
+    for breakdown in (
+        analytics.browsers,
+        analytics.operating_systems,
+        analytics.device_types,
+    ):
+        assert sum(item.count for item in breakdown) == analytics.total_clicks
+    assert [(item.name, item.count) for item in analytics.browsers] == [
+        ("Chrome", 3),
+        ("Safari", 2),
+        ("Firefox", 1),
+    ]
+    assert {item.name: item.count for item in analytics.device_types} == {
+        "Desktop": 4,
+        "Mobile": 2,
+    }
+
+
+async def test_clicks_are_logged_at_their_redirect_time(db):
+    link = await crud.insert_link(
+        db, schemas.LinkCreate(original_url="https://example.com/"), "abc1234"
+    )
+    # Replayed from the spool two days after the redirect.
+    two_days_ago = datetime.now(timezone.utc).replace(hour=12) - timedelta(days=2)
+    info = classify_user_agent(CHROME_WINDOWS)
+    await crud.log_click_to_db(
+        db, link.id, "10.0.0.1", CHROME_WINDOWS, info, clicked_at=two_days_ago
+    )
+
+    analytics = await crud.get_link_analytics(db, link.id)
+    assert [(day.date, day.count) for day in analytics.clicks_by_day] == [
+        (two_days_ago.date(), 1)
+    ]
+
+
+async def test_bot_clicks_do_not_count_as_visits(db):
+    link = await crud.insert_link(
+        db, schemas.LinkCreate(original_url="https://example.com/"), "abc1234"
+    )
+    await log_click(db, link.id, GOOGLEBOT)
+    await log_click(db, link.id, CHROME_WINDOWS)
+
+    await db.refresh(link)
+    assert link.visit_count == 1
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from app import cache, click_filter
+from app.config import settings
+from app.user_agents import classify_user_agent
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(click_filter, "time", SimpleNamespace(time=clock))
+    monkeypatch.setattr(settings, "CLICK_DEDUP_WINDOW_SECONDS", 30)
+    monkeypatch.setattr(cache, "redis_pool", fakeredis.FakeAsyncRedis())
+    return clock
+
+
+async def test_repeat_click_is_a_duplicate(clock):
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+    assert await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+
+
+async def test_other_ips_and_links_are_not_duplicates(clock):
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.2")
+    assert not await click_filter.is_duplicate_click("xyz9876", "10.0.0.1")
+
+
+async def test_previous_bucket_still_counts(clock):
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+    clock.now += 30
+    assert await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+
+
+async def test_clicks_outside_the_window_are_not_duplicates(clock):
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+    clock.now += 60
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+
+
+async def test_disabled_window(clock, monkeypatch):
+    monkeypatch.setattr(settings, "CLICK_DEDUP_WINDOW_SECONDS", 0)
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+
+
+async def test_redis_errors_let_clicks_through(clock, monkeypatch):
+    class UnavailableRedis:
+        def pipeline(self, transaction=True):
+            raise ConnectionError("Redis is down")
+
+    monkeypatch.setattr(cache, "redis_pool", UnavailableRedis())
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+
+
+async def test_clicks_are_bucketed_by_their_redirect_time(clock):
+    clicked_at = clock.now
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1", clicked_at)
+    # Both clicks are replayed from the spool long after they were made.
+    clock.now += 3600
+    assert await click_filter.is_duplicate_click("abc1234", "10.0.0.1", clicked_at + 5)
+    assert not await click_filter.is_duplicate_click("abc1234", "10.0.0.1")
+
+
+def test_missing_user_agent_is_a_bot():
+    assert classify_user_agent("").is_bot
@@ -0,0 +1,147 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+
+import pytest
+
+from app import tasks
+from app.config import settings
+from app.resilience import CircuitBreaker
+
+
+class Broker:
+    """Records enqueued clicks, or fails while `available` is False."""
+
+    def __init__(self):
+        self.sent = []
+        self.available = True
+
+    def send(self, *click):
+        if not self.available:
+            raise ConnectionError("broker is down")
+        self.sent.append(list(click))
+
+
+@pytest.fixture
+def broker(tmp_path, monkeypatch):
+    broker = Broker()
+    monkeypatch.setattr(settings, "CLICK_SPOOL_PATH", str(tmp_path / "clicks.spool"))
+    monkeypatch.setattr(tasks.log_click_task, "send", broker.send)
+    monkeypatch.setattr(
+        tasks,
+        "broker_breaker",
+        CircuitBreaker("test", timeout=5, failure_threshold=100),
+    )
+    monkeypatch.setattr(tasks, "_replay_file", None)
+    yield broker
+    if tasks._replay_file is not None:
+        tasks._replay_file.close()
+
+
+def spool_clicks(count):
+    for i in range(count):
+        tasks.spool_click([i, "127.0.0.1", "agent", f"code{i}", 1_700_000_000.0 + i])
+
+
+def test_send_click_spools_when_broker_is_down(broker):
+    broker.available = False
+    tasks.send_click(1, "127.0.0.1", "agent", "abc1234", 1_700_000_000.5)
+    with open(settings.CLICK_SPOOL_PATH, encoding="utf-8") as spool:
+        assert [json.loads(line) for line in spool] == [
+            [1, "127.0.0.1", "agent", "abc1234", 1_700_000_000.5]
+        ]
+
+    broker.available = True
+    assert tasks.replay_spooled_clicks(10) == 1
+    assert broker.sent == [[1, "127.0.0.1", "agent", "abc1234", 1_700_000_000.5]]
+
+
+def test_replays_in_bounded_batches(broker):
+    spool_clicks(5)
+
+    assert tasks.replay_spooled_clicks(2) == 2
+    assert tasks.replay_spooled_clicks(2) == 2
+    # Clicks spooled mid-replay wait for the next spool to be picked up.
+    spool_clicks(1)
+    assert tasks.replay_spooled_clicks(2) == 1
+    assert [click[0] for click in broker.sent] == [0, 1, 2, 3, 4]
+
+    assert tasks.replay_spooled_clicks(2) == 1
+    assert tasks.replay_spooled_clicks(2) == 0
+    assert [click[0] for click in broker.sent] == [0, 1, 2, 3, 4, 0]
+    assert os.listdir(os.path.dirname(settings.CLICK_SPOOL_PATH)) == [
+        "clicks.spool.lock"
+    ]
+
+
+def test_replay_resumes_after_broker_failure(broker):
+    spool_clicks(3)
+    assert tasks.replay_spooled_clicks(1) == 1
+
+    broker.available = False
+    assert tasks.replay_spooled_clicks(10) == 0
+
+    broker.available = True
+    assert tasks.replay_spooled_clicks(10) == 2
+    assert [click[0] for click in broker.sent] == [0, 1, 2]
+
+
+def test_replay_skips_malformed_lines(broker):
+    spool_clicks(1)
+    with open(settings.CLICK_SPOOL_PATH, "a", encoding="utf-8") as spool:
+        spool.write("not json\n")
+    spool_clicks(1)
+
+    assert tasks.replay_spooled_clicks(10) == 2
+
+
+def test_replay_without_spool(broker):
+    assert tasks.replay_spooled_clicks(10) == 0
+
+
+def write_replay_file(pid, click_ids):
+    path = f"{settings.CLICK_SPOOL_PATH}.{pid}.replay"
+    with open(path, "w", encoding="utf-8") as replay:
+        for i in click_ids:
+            replay.write(json.dumps([i, "127.0.0.1", "agent", f"code{i}"]) + "\n")
+    return path
+
+
+def test_replay_adopts_orphaned_replay_files(broker):
+    write_replay_file(99999, [0, 1])
+    spool_clicks(1)
+
+    assert tasks.replay_spooled_clicks(10) == 2
+    assert tasks.replay_spooled_clicks(10) == 1
+    assert tasks.replay_spooled_clicks(10) == 0
+    assert [click[0] for click in broker.sent] == [0, 1, 0]
+    assert not glob.glob(f"{settings.CLICK_SPOOL_PATH}*.replay")
+
+
+def test_replay_leaves_locked_replay_files_alone(broker):
+    path = write_replay_file(99999, [0, 1])
+    with open(path, encoding="utf-8") as replay:
+        # Held by a running process that is replaying it.
+        fcntl.flock(replay, fcntl.LOCK_EX)
+        assert tasks.replay_spooled_clicks(10) == 0
+    assert broker.sent == []
+    assert os.path.exists(path)
+
+
+def test_spool_appends_wait_for_the_replay_rename(broker):
+    spooled = threading.Event()
+
+    def spool():
+        tasks.spool_click([1, "127.0.0.1", "agent", "abc1234"])
+        spooled.set()
+
+    with tasks._locked_spool():
+        thread = threading.Thread(target=spool)
+        thread.start()
+        assert not spooled.wait(0.1)
+        assert not os.path.exists(settings.CLICK_SPOOL_PATH)
+    thread.join()
+    assert spooled.is_set()
+    assert tasks.replay_spooled_clicks(10) == 1
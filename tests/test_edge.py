@@ -0,0 +1,65 @@
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app import edge, schemas
+
+
+def link_data(**overrides):
+    data = {
+        "link_id": 1,
+        "original_url": "https://example.com/",
+        "expires_at": None,
+        "redirect_status": 307,
+        "cache_max_age": None,
+    }
+    data.update(overrides)
+    return data
+
+
+def test_uncached_temporary_redirect_has_no_headers():
+    assert edge.get_redirect_headers("abc1234", link_data()) == {}
+
+
+@pytest.mark.parametrize("status", [301, 308])
+def test_uncached_permanent_redirect_is_not_stored(status):
+    for expires_at in (None, time.time() + 3600):
+        headers = edge.get_redirect_headers(
+            "abc1234", link_data(redirect_status=status, expires_at=expires_at)
+        )
+        assert headers == {"Cache-Control": "no-store"}
+
+
+def test_cached_redirect_headers():
+    headers = edge.get_redirect_headers(
+        "abc1234", link_data(redirect_status=301, cache_max_age=600)
+    )
+    assert headers["Cache-Control"] == "public, max-age=600"
+    assert headers["Surrogate-Control"] == "max-age=600"
+    assert headers["Surrogate-Key"] == "abc1234"
+
+
+def test_cached_redirect_never_outlives_the_link():
+    headers = edge.get_redirect_headers(
+        "abc1234",
+        link_data(redirect_status=308, cache_max_age=3600, expires_at=time.time() + 60),
+    )
+    max_age = int(headers["Cache-Control"].rsplit("=", 1)[1])
+    assert 0 < max_age <= 60
+
+
+@pytest.mark.parametrize("status", [301, 308])
+def test_permanent_redirects_cannot_be_click_limited(status):
+    with pytest.raises(ValidationError):
+        schemas.LinkCreate(
+            original_url="https://example.com/", redirect_status=status, max_clicks=5
+        )
+
+
+@pytest.mark.parametrize("status", [302, 307])
+def test_temporary_redirects_can_be_click_limited(status):
+    link = schemas.LinkCreate(
+        original_url="https://example.com/", redirect_status=status, max_clicks=5
+    )
+    assert link.max_clicks == 5
@@ -0,0 +1,205 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import fakeredis
+import pytest
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app import cache, crud, models, schemas, sharding, sweeper, tasks
+from app.config import settings
+from app.user_agents import classify_user_agent
+
+
+class UnavailableRedis:
+    async def delete(self, *keys):
+        raise ConnectionError("Redis is down")
+
+
+@pytest.fixture
+def sweep_shards(session_factory, monkeypatch):
+    monkeypatch.setattr(sharding, "shard_sessions", [session_factory])
+    monkeypatch.setattr(settings, "LINK_SWEEP_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "EDGE_PURGE_URL", None)
+    monkeypatch.setattr(cache, "redis_pool", fakeredis.FakeAsyncRedis())
+
+
+async def create_link(db, short_code, **fields):
+    # Built without validation, so links can be created already expired.
+    values = {
+        "original_url": "https://example.com/",
+        "expires_at": None,
+        "max_clicks": None,
+        "redirect_status": 307,
+        "cache_max_age": None,
+    }
+    values.update(fields)
+    link = schemas.LinkCreate.model_construct(**values)
+    return await crud.insert_link(db, link, short_code)
+
+
+async def count_links(db, **filters):
+    query = select(func.count()).select_from(models.Link).filter_by(**filters)
+    return (await db.execute(query)).scalar_one()
+
+
+async def test_sweep_survives_redis_errors(db, sweep_shards, monkeypatch):
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    for i in range(5):
+        await create_link(db, f"old{i}", expires_at=past)
+    monkeypatch.setattr(cache, "redis_pool", UnavailableRedis())
+
+    assert await sweeper.sweep_expired_links() == 5
+    assert await count_links(db) == 0
+
+
+async def test_sweeper_keeps_running_after_a_failed_sweep(monkeypatch):
+    sweeps = []
+
+    async def failing_sweep():
+        sweeps.append(1)
+        raise ConnectionError("database is down")
+
+    async def sleep(seconds):
+        if len(sweeps) == 2:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(sweeper, "sweep_expired_links", failing_sweep)
+    monkeypatch.setattr(sweeper.asyncio, "sleep", sleep)
+    monkeypatch.setattr(cache, "redis_pool", fakeredis.FakeAsyncRedis())
+
+    with pytest.raises(asyncio.CancelledError):
+        await sweeper.run_sweeper()
+    assert len(sweeps) == 2
+
+
+def link_row(**fields):
+    values = {
+        "archived_at": None,
+        "expires_at": None,
+        "max_clicks": None,
+        "visit_count": 0,
+    }
+    values.update(fields)
+    return models.Link(**values)
+
+
+def test_is_link_expired():
+    now = datetime.now(timezone.utc)
+    assert not crud.is_link_expired(link_row())
+    assert not crud.is_link_expired(link_row(expires_at=now + timedelta(hours=1)))
+    assert crud.is_link_expired(link_row(expires_at=now - timedelta(seconds=1)))
+    # SQLite returns naive datetimes, which are stored in UTC.
+    naive_past = (now - timedelta(seconds=1)).replace(tzinfo=None)
+    assert crud.is_link_expired(link_row(expires_at=naive_past))
+    assert crud.is_link_expired(link_row(archived_at=now))
+    assert not crud.is_link_expired(link_row(max_clicks=2, visit_count=1))
+    assert crud.is_link_expired(link_row(max_clicks=2, visit_count=2))
+
+
+def test_cache_ttl_is_capped_by_expiry(monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_TTL_SECONDS", 3600)
+    now = datetime.now(timezone.utc).timestamp()
+    assert cache.get_cache_ttl(None) == 3600
+    assert cache.get_cache_ttl(now + 7200) == 3600
+    assert 0 < cache.get_cache_ttl(now + 60) <= 60
+    assert cache.get_cache_ttl(now - 60) == 0
+
+
+async def test_expired_links_are_not_cached(monkeypatch):
+    redis = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(cache, "redis_pool", redis)
+    now = datetime.now(timezone.utc).timestamp()
+
+    await cache.set_link_in_cache("old1234", {"expires_at": now - 1})
+    await cache.set_link_in_cache("new1234", {"expires_at": now + 60})
+
+    assert await redis.get("old1234") is None
+    assert 0 < await redis.ttl("new1234") <= 60
+
+
+def test_expires_at_must_be_in_the_future():
+    with pytest.raises(ValueError):
+        schemas.LinkCreate(
+            original_url="https://example.com/",
+            expires_at=datetime.now(timezone.utc) - timedelta(seconds=1),
+        )
+
+
+def test_expires_at_is_normalized_to_utc():
+    naive = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    link = schemas.LinkCreate(original_url="https://example.com/", expires_at=naive)
+    assert link.expires_at == naive.replace(tzinfo=timezone.utc)
+
+    offset = timezone(timedelta(hours=2))
+    local = datetime.now(offset).replace(microsecond=0) + timedelta(hours=1)
+    link = schemas.LinkCreate(original_url="https://example.com/", expires_at=local)
+    assert link.expires_at.tzinfo == timezone.utc
+    assert link.expires_at == local
+
+
+async def create_swept_links(db):
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    expired = await create_link(db, "expired", expires_at=past)
+    used_up = await create_link(db, "usedup1", max_clicks=1)
+    live = await create_link(
+        db, "live123", expires_at=datetime.now(timezone.utc) + timedelta(hours=1)
+    )
+    limited = await create_link(db, "limited", max_clicks=5)
+    info = classify_user_agent("Mozilla/5.0 Firefox/121.0")
+    for link in (expired, used_up, live, limited):
+        await crud.log_click_to_db(db, link.id, "10.0.0.1", "agent", info)
+    return expired, used_up, live, limited
+
+
+async def test_sweep_deletes_expired_links_with_their_clicks(db):
+    expired, used_up, live, limited = await create_swept_links(db)
+
+    swept = await crud.sweep_expired_links(db, batch_size=10)
+
+    assert sorted(swept) == ["expired", "usedup1"]
+    assert await count_links(db) == 2
+    for link in (expired, used_up):
+        for model in (models.Click, models.ClickDimensionCount):
+            query = select(func.count()).select_from(model).filter_by(link_id=link.id)
+            assert (await db.execute(query)).scalar_one() == 0
+    assert await crud.sweep_expired_links(db, batch_size=10) == []
+
+
+async def test_sweep_archives_expired_links(db):
+    await create_swept_links(db)
+
+    assert len(await crud.sweep_expired_links(db, batch_size=1, archive=True)) == 1
+    assert len(await crud.sweep_expired_links(db, batch_size=1, archive=True)) == 1
+    assert await crud.sweep_expired_links(db, batch_size=1, archive=True) == []
+
+    assert await count_links(db) == 4
+    archived = (
+        await db.execute(select(models.Link).where(models.Link.archived_at.isnot(None)))
+    ).scalars()
+    assert sorted(link.short_code for link in archived) == ["expired", "usedup1"]
+    assert await crud.get_link_by_short_code(db, "expired")
+
+
+async def test_worker_evicts_links_that_reach_their_click_limit(
+    db, session_factory, monkeypatch
+):
+    redis = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(cache, "redis_pool", redis)
+    monkeypatch.setattr(sharding, "shard_sessions", [session_factory])
+    monkeypatch.setattr(sharding, "router", sharding.ShardRouter(1, 64))
+    monkeypatch.setattr(sharding, "previous_router", None)
+    link = await create_link(db, "limit12", max_clicks=2)
+    await cache.set_link_in_cache("limit12", cache.make_cache_data(link))
+
+    chrome = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    )
+    # The actor wraps the coroutine to run it on the worker's event loop.
+    log_click = tasks.log_click_task.fn.__wrapped__
+    await log_click(link.id, "10.0.0.1", chrome, "limit12")
+    assert await redis.get("limit12") is not None
+
+    await log_click(link.id, "10.0.0.2", chrome, "limit12")
+    assert await redis.get("limit12") is None
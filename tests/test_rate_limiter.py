@@ -0,0 +1,72 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from fastapi_limiter import FastAPILimiter
+
+from app import cache
+from app.dependencies import rate_limit_dependency
+
+
+class UnavailableRedis:
+    async def script_load(self, script):
+        raise ConnectionError("Redis is down")
+
+    async def evalsha(self, *args):
+        raise ConnectionError("Redis is down")
+
+
+class CountingRedis:
+    """Stands in for the limiter's Lua script: allows `times` calls per key."""
+
+    def __init__(self):
+        self.counts = {}
+
+    async def script_load(self, script):
+        return "sha"
+
+    async def evalsha(self, sha, numkeys, key, times, milliseconds):
+        assert sha == "sha"
+        self.counts[key] = self.counts.get(key, 0) + 1
+        return 0 if self.counts[key] <= int(times) else int(milliseconds)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # The limiter keeps its state on the class; restore it after each test.
+    for attribute in ("redis", "prefix", "lua_sha", "identifier", "http_callback"):
+        monkeypatch.setattr(
+            FastAPILimiter, attribute, getattr(FastAPILimiter, attribute)
+        )
+    monkeypatch.setattr(cache, "redis_pool", UnavailableRedis())
+
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(rate_limit_dependency)])
+    async def limited():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_fails_open_when_redis_is_down_at_startup(client):
+    for _ in range(rate_limit_dependency.times + 5):
+        assert client.get("/limited").status_code == 200
+
+
+def test_fails_open_when_redis_goes_down(client, monkeypatch):
+    monkeypatch.setattr(cache, "redis_pool", CountingRedis())
+    assert client.get("/limited").status_code == 200
+
+    FastAPILimiter.redis = UnavailableRedis()
+    assert client.get("/limited").status_code == 200
+
+
+def test_initializes_lazily_once_redis_recovers(client, monkeypatch):
+    assert client.get("/limited").status_code == 200
+
+    monkeypatch.setattr(cache, "redis_pool", CountingRedis())
+    statuses = [
+        client.get("/limited").status_code
+        for _ in range(rate_limit_dependency.times + 1)
+    ]
+    assert statuses == [200] * rate_limit_dependency.times + [429]
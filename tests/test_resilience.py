@@ -0,0 +1,184 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import resilience
+from app.resilience import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only the breaker's clock is faked; the event loop keeps the real one.
+    monkeypatch.setattr(resilience, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+async def succeed():
+    return "ok"
+
+
+async def fail():
+    raise ConnectionError("down")
+
+
+def fail_sync():
+    raise ConnectionError("down")
+
+
+async def hang():
+    await asyncio.sleep(3600)
+
+
+async def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+
+
+async def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", timeout=1, failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+    assert breaker.state == "closed"
+
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(succeed)
+
+
+async def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("test", timeout=1, failure_threshold=2, reset_timeout=10)
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    assert await breaker.call(succeed) == "ok"
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    assert breaker.state == "closed"
+
+
+async def test_timeouts_count_as_failures(clock):
+    breaker = CircuitBreaker("test", timeout=0.01, failure_threshold=1)
+    with pytest.raises(asyncio.TimeoutError):
+        await breaker.call(hang)
+    assert breaker.state == "open"
+
+
+async def test_half_open_trial_closes_on_success(clock):
+    breaker = CircuitBreaker("test", timeout=1, failure_threshold=1, reset_timeout=10)
+    await open_breaker(breaker)
+
+    clock.now += 10
+    assert breaker.state == "half_open"
+    assert await breaker.call(succeed) == "ok"
+    assert breaker.state == "closed"
+
+
+async def test_half_open_trial_reopens_on_failure(clock):
+    breaker = CircuitBreaker("test", timeout=1, failure_threshold=1, reset_timeout=10)
+    await open_breaker(breaker)
+
+    clock.now += 10
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    assert breaker.state == "open"
+
+
+async def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker("test", timeout=5, failure_threshold=1, reset_timeout=10)
+    await open_breaker(breaker)
+
+    clock.now += 10
+    trial = asyncio.ensure_future(breaker.call(hang))
+    await asyncio.sleep(0)
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(succeed)
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+
+async def test_cancelled_trial_frees_the_trial_slot(clock):
+    breaker = CircuitBreaker("test", timeout=5, failure_threshold=1, reset_timeout=10)
+    await open_breaker(breaker)
+
+    clock.now += 10
+    trial = asyncio.ensure_future(breaker.call(hang))
+    await asyncio.sleep(0)
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    assert breaker.state == "half_open"
+    assert await breaker.call(succeed) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_call_sync_counts_overruns_as_failures(clock):
+    breaker = CircuitBreaker("test", timeout=1, failure_threshold=1)
+
+    def slow():
+        clock.now += 2
+        return "late"
+
+    assert breaker.call_sync(slow) == "late"
+    assert breaker.state == "open"
+
+
+def test_call_sync_allows_a_single_trial_across_threads(clock):
+    breaker = CircuitBreaker("test", timeout=5, failure_threshold=1, reset_timeout=10)
+    with pytest.raises(ConnectionError):
+        breaker.call_sync(fail_sync)
+
+    clock.now += 10
+    release = threading.Event()
+    started = threading.Barrier(8)
+    outcomes = []
+
+    def call():
+        started.wait()
+        try:
+            outcomes.append(breaker.call_sync(release.wait, 5))
+        except CircuitOpenError:
+            outcomes.append("rejected")
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while len(outcomes) < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count("rejected") == 7
+    assert breaker.state == "closed"
+
+
+def test_concurrent_failures_are_all_counted():
+    breaker = CircuitBreaker("test", timeout=5, failure_threshold=10**6)
+
+    def fail_many():
+        for _ in range(1000):
+            breaker.record_failure()
+
+    threads = [threading.Thread(target=fail_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert breaker.failures == 8000
@@ -0,0 +1,400 @@
+import asyncio
+import time
+from pathlib import Path
+
+import fakeredis
+import httpx
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, inspect
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+
+from app import (
+    cache,
+    crud,
+    main,
+    models,
+    rebalance,
+    schemas,
+    sharded_crud,
+    sharding,
+    utils,
+)
+from app.config import settings
+from app.resilience import CircuitBreaker, CircuitOpenError
+from app.routers.health import get_health
+from app.sharding import ShardRouter
+from app.user_agents import classify_user_agent
+
+BROWSER = classify_user_agent(
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+ALEMBIC_CONFIG = str(Path(__file__).parents[1] / "alembic.ini")
+
+
+@pytest.fixture
+async def configure_shards(tmp_path, monkeypatch):
+    """
+    Points the shard layer at SQLite files migrated by Alembic, keeping them
+    across calls.
+    """
+    engines = {}
+    monkeypatch.setattr(cache, "redis_pool", fakeredis.FakeAsyncRedis())
+
+    async def configure(count, previous_count=None):
+        urls = [
+            f"sqlite+aiosqlite:///{tmp_path / f'shard{shard}.db'}"
+            for shard in range(count)
+        ]
+        monkeypatch.setattr(settings, "SHARD_DATABASE_URLS", urls)
+        # The migrations run their shards on their own event loop.
+        await asyncio.to_thread(command.upgrade, Config(ALEMBIC_CONFIG), "head")
+
+        sessions = []
+        for shard in range(count):
+            if shard not in engines:
+                engines[shard] = create_async_engine(urls[shard])
+            sessions.append(async_sessionmaker(engines[shard], expire_on_commit=False))
+        monkeypatch.setattr(sharding, "shard_sessions", sessions)
+        monkeypatch.setattr(sharding, "router", ShardRouter(count, 64))
+        monkeypatch.setattr(
+            sharding,
+            "previous_router",
+            ShardRouter(previous_count, 64) if previous_count else None,
+        )
+        monkeypatch.setattr(
+            sharding,
+            "database_breakers",
+            [CircuitBreaker(f"shard_{shard}", timeout=5) for shard in range(count)],
+        )
+
+    yield configure
+    for engine in engines.values():
+        await engine.dispose()
+
+
+def url_moving_to(shard, before, after):
+    """Finds a URL whose unsalted short code moves to `shard` between rings."""
+    for i in range(10000):
+        url = f"https://example.com/page/{i}"
+        code = utils.generate_short_code(url)
+        if after.shard_for(code) == shard and before.shard_for(code) != shard:
+            return url
+    raise AssertionError("no URL moves to the shard")
+
+
+async def count_rows(shard, model, **filters):
+    async with sharding.shard_sessions[shard]() as db:
+        query = select(func.count()).select_from(model).filter_by(**filters)
+        return (await db.execute(query)).scalar_one()
+
+
+async def log_clicks(short_code, count):
+    for i in range(count):
+        link = await sharded_crud.log_click_to_db(
+            short_code, f"10.0.0.{i}", "agent", BROWSER
+        )
+        assert link is not None
+
+
+async def test_shards_are_migrated_without_the_users_table(configure_shards):
+    await configure_shards(2)
+    for shard in range(2):
+        async with sharding.shard_sessions[shard]() as db:
+            connection = await db.connection()
+            tables = await connection.run_sync(
+                lambda sync_connection: inspect(sync_connection).get_table_names()
+            )
+        assert set(tables) == {
+            "alembic_version",
+            "links",
+            "clicks",
+            "click_dimension_counts",
+        }
+
+
+async def test_links_are_stored_on_their_owner_shard(configure_shards):
+    await configure_shards(3)
+    for i in range(30):
+        link = await sharded_crud.create_short_link(
+            schemas.LinkCreate(original_url=f"https://example.com/{i}"), user_id=1
+        )
+        owner = sharding.router.shard_for(link.short_code)
+        async with sharding.shard_sessions[owner]() as db:
+            assert await crud.get_link_by_short_code(db, link.short_code)
+        found = await sharded_crud.get_link_by_short_code(link.short_code)
+        assert found.original_url == f"https://example.com/{i}"
+
+    assert sum([await count_rows(shard, models.Link) for shard in range(3)]) == 30
+
+
+async def test_clicks_are_logged_on_the_links_shard(configure_shards):
+    await configure_shards(3)
+    link = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url="https://example.com/"), user_id=1
+    )
+    await log_clicks(link.short_code, 3)
+
+    found = await sharded_crud.get_link_by_short_code(link.short_code)
+    assert found.visit_count == 3
+    assert (
+        await sharded_crud.log_click_to_db("missing", "10.0.0.1", "", BROWSER) is None
+    )
+
+
+async def test_list_links_merges_shards_newest_first(configure_shards):
+    await configure_shards(3)
+    for i in range(10):
+        await sharded_crud.create_short_link(
+            schemas.LinkCreate(original_url=f"https://example.com/{i}"), user_id=1
+        )
+    await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url="https://example.com/other"), user_id=2
+    )
+
+    links = await sharded_crud.get_links_by_user(user_id=1, limit=5)
+    assert len(links) == 5
+    created = [utils.as_utc(link.created_at) for link in links]
+    assert created == sorted(created, reverse=True)
+    assert {link.user_id for link in links} == {1}
+
+
+async def test_appended_shard_falls_back_until_rebalanced(configure_shards):
+    await configure_shards(3)
+    url = url_moving_to(3, ShardRouter(3, 64), ShardRouter(4, 64))
+    original = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url=url), user_id=1
+    )
+    old_shard = sharding.router.shard_for(original.short_code)
+    await log_clicks(original.short_code, 3)
+
+    # Append a shard. Until the rebalance, the link is found on its old shard.
+    await configure_shards(4, previous_count=3)
+    assert sharding.router.shard_for(original.short_code) == 3
+    assert (await sharded_crud.get_link_by_short_code(original.short_code)).id
+    assert await sharding.locate_shard(original.short_code) == old_shard
+    await log_clicks(original.short_code, 1)
+
+    # Creating the same URL again must not reuse the code on the new shard.
+    link = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url=url, redirect_status=302), user_id=2
+    )
+    assert link.short_code != original.short_code
+
+    await rebalance.rebalance(batch_size=2, dry_run=False)
+
+    assert await count_rows(old_shard, models.Link, short_code=original.short_code) == 0
+    moved = await sharded_crud.get_link_by_short_code(original.short_code)
+    assert moved.user_id == 1
+    assert moved.visit_count == 4
+    assert await count_rows(3, models.Click, link_id=moved.id) == 4
+    assert await count_rows(old_shard, models.Click, link_id=original.id) == 0
+
+
+async def test_rebalance_dry_run_moves_nothing(configure_shards):
+    await configure_shards(3)
+    url = url_moving_to(3, ShardRouter(3, 64), ShardRouter(4, 64))
+    link = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url=url), user_id=1
+    )
+
+    await configure_shards(4, previous_count=3)
+    await rebalance.rebalance(batch_size=10, dry_run=True)
+    assert await count_rows(3, models.Link) == 0
+    assert await sharded_crud.get_link_by_short_code(link.short_code)
+
+
+async def test_rebalance_finishes_an_interrupted_move(configure_shards):
+    await configure_shards(3)
+    url = url_moving_to(3, ShardRouter(3, 64), ShardRouter(4, 64))
+    link = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url=url), user_id=1
+    )
+    old_shard = sharding.router.shard_for(link.short_code)
+    await log_clicks(link.short_code, 2)
+
+    await configure_shards(4, previous_count=3)
+    # The copy was committed on the new shard, but the old one was not cleared.
+    async with sharding.shard_sessions[3]() as target:
+        target.add(rebalance._copy_row(link))
+        await target.commit()
+
+    await rebalance.rebalance(batch_size=10, dry_run=False)
+    assert await count_rows(3, models.Link, short_code=link.short_code) == 1
+    assert await count_rows(old_shard, models.Link, short_code=link.short_code) == 0
+
+
+async def test_rebalance_copies_clicks_logged_after_the_batch_load(configure_shards):
+    await configure_shards(3)
+    url = url_moving_to(3, ShardRouter(3, 64), ShardRouter(4, 64))
+    link = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url=url), user_id=1
+    )
+    old_shard = sharding.router.shard_for(link.short_code)
+    await log_clicks(link.short_code, 2)
+
+    await configure_shards(4, previous_count=3)
+    async with sharding.shard_sessions[old_shard]() as source:
+        stale_link = await crud.get_link_by_short_code(source, link.short_code)
+        await log_clicks(link.short_code, 1)
+        await rebalance.move_link(source, stale_link, sharding.shard_sessions[3])
+
+    moved = await sharded_crud.get_link_by_short_code(link.short_code)
+    assert moved.visit_count == 3
+    assert await count_rows(3, models.Click, link_id=moved.id) == 3
+    async with sharding.shard_sessions[3]() as db:
+        analytics = await crud.get_link_analytics(db, moved.id)
+    assert sum(item.count for item in analytics.browsers) == 3
+
+
+async def test_clicks_during_a_move_are_logged_on_the_new_shard(
+    configure_shards, monkeypatch
+):
+    await configure_shards(3)
+    url = url_moving_to(3, ShardRouter(3, 64), ShardRouter(4, 64))
+    link = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url=url), user_id=1
+    )
+    old_shard = sharding.router.shard_for(link.short_code)
+    await configure_shards(4, previous_count=3)
+
+    log_click_to_db = crud.log_click_to_db
+
+    async def log_click_during_move(db, link_id, *args, **kwargs):
+        monkeypatch.setattr(crud, "log_click_to_db", log_click_to_db)
+        # The link is moved after the worker found it on its old shard.
+        async with sharding.shard_sessions[old_shard]() as source:
+            stale_link = await crud.get_link_by_short_code(source, link.short_code)
+            await rebalance.move_link(source, stale_link, sharding.shard_sessions[3])
+        return await log_click_to_db(db, link_id, *args, **kwargs)
+
+    monkeypatch.setattr(crud, "log_click_to_db", log_click_during_move)
+    await log_clicks(link.short_code, 1)
+
+    moved = await sharded_crud.get_link_by_short_code(link.short_code)
+    assert moved.visit_count == 1
+    assert await count_rows(3, models.Click, link_id=moved.id) == 1
+
+
+async def test_rebalance_stops_on_a_conflicting_link(configure_shards):
+    await configure_shards(3)
+    url = url_moving_to(3, ShardRouter(3, 64), ShardRouter(4, 64))
+    link = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url=url), user_id=1
+    )
+    old_shard = sharding.router.shard_for(link.short_code)
+    await log_clicks(link.short_code, 3)
+
+    # A different link was created under the same code on the new shard,
+    # e.g. by an instance that was not configured with SHARD_PREVIOUS_COUNT.
+    await configure_shards(4)
+    async with sharding.shard_sessions[3]() as target:
+        await crud.insert_link(
+            target, schemas.LinkCreate(original_url=url), link.short_code, user_id=2
+        )
+
+    with pytest.raises(rebalance.RebalanceConflictError):
+        await rebalance.rebalance(batch_size=10, dry_run=False)
+
+    assert await count_rows(old_shard, models.Link, short_code=link.short_code) == 1
+    assert await count_rows(old_shard, models.Click, link_id=link.id) == 3
+
+
+async def test_same_url_is_deduplicated_across_shards(configure_shards):
+    await configure_shards(3)
+    url = "https://example.com/shared"
+    # The 301 link takes the unsalted code, so the later links get salted ones.
+    permanent = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url=url, redirect_status=301), user_id=1
+    )
+    links = [
+        await sharded_crud.create_short_link(
+            schemas.LinkCreate(original_url=url), user_id=1
+        )
+        for _ in range(3)
+    ]
+
+    assert permanent.short_code == utils.generate_short_code(url)
+    assert len({link.short_code for link in links}) == 1
+    assert links[0].short_code != permanent.short_code
+    assert sum([await count_rows(shard, models.Link) for shard in range(3)]) == 2
+
+
+async def test_links_with_limits_are_never_deduplicated(configure_shards):
+    await configure_shards(3)
+    links = [
+        await sharded_crud.create_short_link(
+            schemas.LinkCreate(original_url="https://example.com/", max_clicks=5),
+            user_id=1,
+        )
+        for _ in range(3)
+    ]
+    assert len({link.short_code for link in links}) == 3
+
+
+async def test_open_breaker_only_fails_its_own_shard(configure_shards):
+    await configure_shards(3)
+    links = [
+        await sharded_crud.create_short_link(
+            schemas.LinkCreate(original_url=f"https://example.com/{i}"), user_id=1
+        )
+        for i in range(20)
+    ]
+    broken_shard = sharding.router.shard_for(links[0].short_code)
+    breaker = sharding.database_breakers[broken_shard]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    for link in links:
+        if sharding.router.shard_for(link.short_code) == broken_shard:
+            with pytest.raises(CircuitOpenError):
+                await sharded_crud.get_link_by_short_code(link.short_code)
+        else:
+            assert await sharded_crud.get_link_by_short_code(link.short_code)
+
+    health = await get_health()
+    assert health["status"] == "degraded"
+    states = {state["name"]: state["state"] for state in health["breakers"]}
+    assert states[f"shard_{broken_shard}"] == "open"
+    assert len(states) == 2 + 3
+
+
+async def test_redirect_resolves_from_the_links_shard(configure_shards, monkeypatch):
+    await configure_shards(3)
+    clicks = []
+    monkeypatch.setattr(main, "send_click", lambda *click: clicks.append(click))
+    monkeypatch.setattr(settings, "SNAPSHOT_MODE", "off")
+    link = await sharded_crud.create_short_link(
+        schemas.LinkCreate(original_url="https://example.com/target", max_clicks=5),
+        user_id=1,
+    )
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get(f"/{link.short_code}")
+        missing = await client.get("/missing")
+
+    assert response.status_code == 307
+    assert response.headers["location"] == "https://example.com/target"
+    assert [click[3] for click in clicks] == [link.short_code]
+    assert abs(clicks[0][4] - time.time()) < 60
+    assert missing.status_code == 404
+
+
+async def test_link_responses_only_expose_ids_without_shards(
+    db, configure_shards, monkeypatch
+):
+    link = await crud.insert_link(
+        db, schemas.LinkCreate(original_url="https://example.com/"), "abc1234"
+    )
+    monkeypatch.setattr(settings, "SHARD_DATABASE_URLS", [])
+    assert schemas.Link.model_validate(link).id == link.id
+
+    # Row IDs repeat across shards; links are identified by short code.
+    await configure_shards(2)
+    assert schemas.Link.model_validate(link).id is None
@@ -0,0 +1,37 @@
+from app.sharding import ShardRouter
+
+SHORT_CODES = [f"code{i:05d}" for i in range(5000)]
+
+
+def test_router_is_deterministic():
+    first = ShardRouter(4, 64)
+    second = ShardRouter(4, 64)
+    assert [first.shard_for(code) for code in SHORT_CODES] == [
+        second.shard_for(code) for code in SHORT_CODES
+    ]
+
+
+def test_router_uses_every_shard():
+    router = ShardRouter(4, 64)
+    owners = [router.shard_for(code) for code in SHORT_CODES]
+    for shard in range(4):
+        # Each shard should own a reasonable share of the codes.
+        assert owners.count(shard) > len(SHORT_CODES) / 4 / 2
+
+
+def test_appending_a_shard_only_moves_codes_to_it():
+    before = ShardRouter(3, 64)
+    after = ShardRouter(4, 64)
+    moved = 0
+    for code in SHORT_CODES:
+        old_owner, new_owner = before.shard_for(code), after.shard_for(code)
+        if old_owner != new_owner:
+            assert new_owner == 3
+            moved += 1
+    # Roughly 1/4 of the codes move to the new shard.
+    assert len(SHORT_CODES) / 8 < moved < len(SHORT_CODES) / 2
+
+
+def test_single_shard_owns_everything():
+    router = ShardRouter(1, 64)
+    assert {router.shard_for(code) for code in SHORT_CODES} == {0}
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from app import snapshot
+from app.config import settings
+
+LINKS = [
+    ("abc1234", 1, "https://example.com/one", 0, 307, None),
+    ("xyz9876", 2, "https://example.com/two", 0, 301, 3600),
+    ("q-w_e12", 3, "https://example.com/ünïcode", 4102444800, 302, 0),
+]
+
+
+@pytest.fixture
+def snapshot_path(tmp_path, monkeypatch):
+    path = tmp_path / "links.snapshot"
+    monkeypatch.setattr(settings, "SNAPSHOT_PATH", str(path))
+    monkeypatch.setattr(settings, "SNAPSHOT_MODE", "first")
+    monkeypatch.setattr(snapshot, "_rejected_stat", None)
+    yield path
+    snapshot.close_snapshot()
+
+
+def test_write_and_lookup_round_trip(tmp_path):
+    path = str(tmp_path / "links.snapshot")
+    assert snapshot.write_snapshot(path, LINKS) == len(LINKS)
+
+    link_snapshot = snapshot.LinkSnapshot(path)
+    try:
+        assert link_snapshot.count == len(LINKS)
+        for short_code, link_id, url, expires_at, status, max_age in LINKS:
+            assert link_snapshot.lookup(short_code) == snapshot.SnapshotEntry(
+                link_id=link_id,
+                original_url=url,
+                expires_at=expires_at or None,
+                redirect_status=status,
+                cache_max_age=max_age,
+            )
+        assert link_snapshot.lookup("missing") is None
+    finally:
+        link_snapshot.close()
+
+
+def test_empty_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "links.snapshot")
+    snapshot.write_snapshot(path, [])
+    link_snapshot = snapshot.LinkSnapshot(path)
+    assert link_snapshot.count == 0
+    assert link_snapshot.lookup("abc1234") is None
+    link_snapshot.close()
+
+
+def test_reload_picks_up_new_export(snapshot_path):
+    snapshot.write_snapshot(str(snapshot_path), LINKS[:1])
+    snapshot.load_snapshot()
+    assert snapshot.get_link_from_snapshot("abc1234").link_id == 1
+    assert snapshot.get_link_from_snapshot("xyz9876") is None
+
+    snapshot.write_snapshot(str(snapshot_path), LINKS[1:])
+    snapshot.load_snapshot()
+    assert snapshot.get_link_from_snapshot("abc1234") is None
+    assert snapshot.get_link_from_snapshot("xyz9876").link_id == 2
+
+
+def test_expired_entries_are_missing(snapshot_path):
+    expired = ("old1234", 9, "https://example.com/old", int(time.time()) - 1, 307, None)
+    snapshot.write_snapshot(str(snapshot_path), [expired])
+    snapshot.load_snapshot()
+    assert snapshot.get_link_from_snapshot("old1234") is None
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda data: b"",
+        lambda data: data[: snapshot.HEADER.size - 1],
+        lambda data: data[:-1],
+        lambda data: data + b"\x00",
+        lambda data: b"USNAP\x00\x00\x01" + data[8:],
+    ],
+    ids=["empty", "short-header", "truncated", "trailing-bytes", "old-version"],
+)
+def test_invalid_file_keeps_previous_snapshot(snapshot_path, corrupt):
+    snapshot.write_snapshot(str(snapshot_path), LINKS)
+    snapshot.load_snapshot()
+    data = snapshot_path.read_bytes()
+
+    replacement = snapshot_path.with_suffix(".tmp")
+    replacement.write_bytes(corrupt(data))
+    replacement.replace(snapshot_path)
+    snapshot.load_snapshot()
+
+    assert snapshot.get_link_from_snapshot("abc1234").link_id == 1
+
+
+def test_invalid_file_without_previous_snapshot(snapshot_path):
+    snapshot_path.write_bytes(b"")
+    snapshot.load_snapshot()
+    assert snapshot.get_link_from_snapshot("abc1234") is None